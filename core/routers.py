@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+REPLICA_DB = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB in settings.DATABASES
+
+
+def read_db_alias():
+    """Алиас БД для чтения в текущем контексте (replica внутри use_replica, иначе default)."""
+    if _use_replica.get() and replica_configured():
+        return REPLICA_DB
+    return 'default'
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтение внутри use_replica() уходит на реплику (если она настроена),
+    все остальное — на основную БД. Запись и миграции всегда на default.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_db_alias()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """Для отчетных APIView: все чтения запроса идут на реплику."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_replica():
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,86 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _list_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Разреженные ответы для GET-запросов:
+      ?fields=a,b   — только перечисленные поля;
+      ?expand=x,y   — вложенные объекты только для этих связей, остальные связи
+                      из Meta.expandable_fields отдаются как id.
+    Без параметров ответ не меняется (все связи раскрыты).
+
+    Meta.expandable_fields: {поле: {'select': [...], 'prefetch': [...], 'collapsed': [...]}} —
+    select_related/prefetch_related для раскрытой связи и prefetch_related для связи в виде id.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields, self.expanded_fields = self.get_field_options(self.context.get('request'))
+        if self.requested_fields is None and self.expanded_fields is None:
+            return
+
+        if self.requested_fields is not None:
+            for name in set(self.fields) - self.requested_fields:
+                self.fields.pop(name)
+        for name in self.expandable_fields():
+            field = self.fields.get(name)
+            if not self.is_expanded(name) and isinstance(field, serializers.BaseSerializer):
+                many = isinstance(field, serializers.ListSerializer)
+                self.fields[name] = serializers.PrimaryKeyRelatedField(many=many, read_only=True)
+
+    @classmethod
+    def expandable_fields(cls):
+        return getattr(cls.Meta, 'expandable_fields', {})
+
+    @classmethod
+    def get_field_options(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        fields, expand = _list_param(request, 'fields'), _list_param(request, 'expand')
+        if fields is None and expand is None:
+            return None, None
+        return fields, expand or set()
+
+    def wants(self, name):
+        return self.requested_fields is None or name in self.requested_fields
+
+    def is_expanded(self, name):
+        return self.wants(name) and (self.expanded_fields is None or name in self.expanded_fields)
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request):
+        """Оставляет в queryset только select/prefetch для запрошенных связей."""
+        fields, expanded = cls.get_field_options(request)
+        if fields is None and expanded is None:
+            return queryset
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        for name, lookups in cls.expandable_fields().items():
+            if fields is not None and name not in fields:
+                continue
+            if name in expanded:
+                if lookups.get('select'):
+                    queryset = queryset.select_related(*lookups['select'])
+                queryset = queryset.prefetch_related(*lookups.get('prefetch', ()))
+            else:
+                queryset = queryset.prefetch_related(*lookups.get('collapsed', ()))
+        return queryset
+
+
+class DynamicFieldsViewMixin:
+    """Для ViewSet: queryset подстраивается под ?fields=/?expand= сериализатора."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, DynamicFieldsMixin):
+            queryset = serializer_class.optimize_queryset(queryset, self.request)
+        return queryset
@@ -76,6 +76,23 @@ DATABASES = {
     }
 }
 
+# POSTGRES_REPLICA_HOST должен указывать на настоящую реплику основной БД (потоковая репликация):
+# на нее уходят чтения отчетов, выгрузок и дашборда, миграции на нее не применяются.
+# Для локальной проверки есть сервис db-replica (docker compose --profile replica), это потоковая реплика db.
+# Без реплики переменную не задавайте — все чтения пойдут в default.
+if config("POSTGRES_REPLICA_HOST", default=""):
+    DATABASES["replica"] = {
+        "ENGINE": 'django.db.backends.postgresql',
+        "NAME": config("POSTGRES_REPLICA_DB", default=DATABASES["default"]["NAME"]),
+        "USER": config("POSTGRES_REPLICA_USER", default=DATABASES["default"]["USER"]),
+        "PASSWORD": config("POSTGRES_REPLICA_PASSWORD", default=DATABASES["default"]["PASSWORD"]),
+        "HOST": config("POSTGRES_REPLICA_HOST"),
+        "PORT": config("POSTGRES_REPLICA_PORT", default=DATABASES["default"]["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -120,6 +137,15 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 SWAGGER_SETTINGS = {
@@ -183,4 +209,33 @@ REDIS_HOST = config('REDIS_HOST')
 REDIS_PORT = config('REDIS_PORT')
 REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
 CELERY_BROKER_URL = REDIS_URL
-CELERY_RESULT_BACKEND = REDIS_URL
\ No newline at end of file
+CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_BEAT_SCHEDULE = {
+    'refresh-report-views': {
+        'task': 'leads.tasks.refresh_report_views',
+        'schedule': timedelta(minutes=10),
+    },
+    'precompute-service-baskets': {
+        'task': 'leads.tasks.precompute_service_baskets',
+        'schedule': timedelta(hours=24),
+    },
+    'compact-counters': {
+        'task': 'leads.tasks.compact_counters',
+        'schedule': timedelta(minutes=1),
+    },
+    'send-due-reminders': {
+        'task': 'leads.tasks.send_due_reminders',
+        'schedule': timedelta(minutes=1),
+    },
+    'purge-lead-tombstones': {
+        'task': 'leads.tasks.purge_lead_tombstones',
+        'schedule': timedelta(hours=24),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+    }
+}
@@ -0,0 +1,4 @@
+#!/bin/bash
+# Разрешает потоковую репликацию для сервиса db-replica (выполняется только при создании тома db).
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Lead
+from .reports import datetime_range
+
+PRE_APPOINTMENT_BUFFER = timedelta(minutes=30)
+POST_APPOINTMENT_BUFFER = timedelta(minutes=10)
+
+BUSY_SLOTS_MAX_DAYS = 31
+BUSY_SLOTS_CACHE_TIMEOUT = 60 * 60
+BUSY_SLOTS_CACHE_PREFIX = 'busy_slots'
+
+
+def busy_slots_cache_key(day):
+    return f'{BUSY_SLOTS_CACHE_PREFIX}:{day.isoformat()}'
+
+
+def _build_days(days):
+    """
+    Занятые интервалы за дни одним запросом по диапазону date_time:
+    {day: {master_id: [[начало, конец], ...]}}, интервалы уже с буферами.
+    """
+    start_dt, end_dt = datetime_range(min(days), max(days))
+    leads = (
+        Lead.objects.filter(date_time__gte=start_dt, date_time__lt=end_dt, master__isnull=False)
+        .values('date_time', 'master_id')
+        .annotate(duration=Coalesce(Sum('services__duration'), 0))
+        .order_by('date_time')
+    )
+    result = {day: {} for day in days}
+    for lead in leads:
+        day = timezone.localtime(lead['date_time']).date()
+        if day not in result:
+            continue
+        start = lead['date_time'] - PRE_APPOINTMENT_BUFFER
+        end = lead['date_time'] + timedelta(minutes=lead['duration']) + POST_APPOINTMENT_BUFFER
+        result[day].setdefault(str(lead['master_id']), []).append([start, end])
+    return result
+
+
+def get_busy_slots(start_date, end_date, master_ids=None):
+    """
+    Занятые интервалы мастеров за период: {master_id: [[начало, конец], ...]}.
+    Каждый день кешируется отдельно и сбрасывается при изменении записей этого дня.
+    """
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    keys = {busy_slots_cache_key(day): day for day in days}
+    cached = cache.get_many(list(keys))
+    by_day = {keys[key]: value for key, value in cached.items()}
+
+    missing = [day for day in days if day not in by_day]
+    if missing:
+        built = _build_days(missing)
+        cache.set_many({busy_slots_cache_key(day): value for day, value in built.items()}, BUSY_SLOTS_CACHE_TIMEOUT)
+        by_day.update(built)
+
+    masters = {}
+    for day in days:
+        for master_id, intervals in by_day[day].items():
+            if master_ids is None or master_id in master_ids:
+                masters.setdefault(master_id, []).extend(intervals)
+    return masters
+
+
+def invalidate_busy_slots(*date_times):
+    days = {
+        (value.date() if timezone.is_naive(value) else timezone.localtime(value).date())
+        for value in date_times if value
+    }
+    if days:
+        cache.delete_many([busy_slots_cache_key(day) for day in days])
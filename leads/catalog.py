@@ -0,0 +1,71 @@
+import hashlib
+import time
+from urllib.parse import urljoin
+
+from django.core.cache import cache
+
+from core.renderers import ORJSONRenderer
+from .models import Service
+from .serializers import ServiceSerializer
+
+CATALOG_CACHE_KEY = 'catalog:services'
+CATALOG_GENERATION_KEY = 'catalog:services:generation'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def catalog_generation():
+    generation = cache.get(CATALOG_GENERATION_KEY)
+    if generation is None:
+        # время, а не 0: после вытеснения счетчика старые ключи каталога не оживают
+        cache.add(CATALOG_GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(CATALOG_GENERATION_KEY)
+    return generation
+
+
+def catalog_cache_key(generation, base_url):
+    host = hashlib.sha256(base_url.encode()).hexdigest()[:16]
+    return f'{CATALOG_CACHE_KEY}:{generation}:{host}'
+
+
+def absolute_image_urls(services, base_url):
+    """Ссылки на изображения относительно хоста запроса, включая вложенные additional_services."""
+    for service in services:
+        if service.get('image'):
+            service['image'] = urljoin(base_url, service['image'])
+        absolute_image_urls(service.get('additional_services', ()), base_url)
+    return services
+
+
+def build_catalog(request, generation=None):
+    """
+    Каталог услуг (все услуги с вложенными additional_services/parent_services)
+    в готовом JSON с абсолютными ссылками на изображения. Версия — хеш содержимого, она же ETag.
+    Сохраняется под поколением, прочитанным до запроса к БД: сборка, начатая до изменения услуг,
+    попадает в уже неиспользуемый ключ и не перезаписывает свежий каталог.
+    """
+    if generation is None:
+        generation = catalog_generation()
+    base_url = request.build_absolute_uri('/')
+    # без request в контексте: параметры ?fields=/?expand= не должны попадать в общий каталог
+    services = absolute_image_urls(ServiceSerializer(Service.objects.with_relations(), many=True).data, base_url)
+    renderer = ORJSONRenderer()
+    version = hashlib.sha256(renderer.render(services)).hexdigest()[:16]
+    catalog = {
+        'version': version,
+        'body': renderer.render({'version': version, 'services': services}),
+    }
+    cache.set(catalog_cache_key(generation, base_url), catalog, CATALOG_CACHE_TIMEOUT)
+    return catalog
+
+
+def get_catalog(request):
+    generation = catalog_generation()
+    catalog = cache.get(catalog_cache_key(generation, request.build_absolute_uri('/')))
+    return catalog or build_catalog(request, generation)
+
+
+def invalidate_catalog():
+    try:
+        cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        cache.add(CATALOG_GENERATION_KEY, time.time_ns(), None)
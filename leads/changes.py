@@ -0,0 +1,87 @@
+from django.db import connections
+from django.db.models import Max
+
+from .models import Counter, Lead, LeadTombstone
+
+LEAD_CHANGES_DEFAULT_LIMIT = 500
+LEAD_CHANGES_MAX_LIMIT = 1000
+LEAD_TOMBSTONES_PURGED_KEY = 'lead_changes_purged_seq'
+
+
+class ChangesTokenExpired(Exception):
+    pass
+
+
+def change_seq_ceiling(using):
+    """
+    Номера изменений от этого значения и выше еще могут появиться в незавершенных транзакциях
+    (номер начинается с id транзакции, миграция 0011) — клиентам их пока не отдаем.
+    None — база без триггеров номеров (не PostgreSQL), ограничения нет.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint << 20')
+        return cursor.fetchone()[0]
+
+
+def current_change_token():
+    ceiling = change_seq_ceiling(Lead.objects.db)
+    if ceiling is not None:
+        return ceiling - 1
+    lead_seq = Lead.objects.aggregate(seq=Max('change_seq'))['seq'] or 0
+    tombstone_seq = LeadTombstone.objects.aggregate(seq=Max('change_seq'))['seq'] or 0
+    return max(lead_seq, tombstone_seq)
+
+
+def lead_changes(since, queryset, limit=LEAD_CHANGES_DEFAULT_LIMIT, master_id=None):
+    """
+    Изменения записей после номера since: (leads, deleted, token, has_more).
+    leads — queryset записей, измененных после since, по возрастанию change_seq;
+    deleted — [(id, change_seq)] записей, удаленных или ушедших к другому мастеру (при фильтре по мастеру);
+    token — номер последнего изменения в ответе, его клиент передает в следующий since.
+    """
+    if since < Counter.get_value(LEAD_TOMBSTONES_PURGED_KEY):
+        raise ChangesTokenExpired
+
+    scope = queryset.filter(master_id=master_id) if master_id else queryset
+    changed = scope.filter(change_seq__gt=since)
+    tombstones = LeadTombstone.objects.using(queryset.db).filter(change_seq__gt=since)
+    ceiling = change_seq_ceiling(queryset.db)
+    if ceiling is not None:
+        changed = changed.filter(change_seq__lt=ceiling)
+        tombstones = tombstones.filter(change_seq__lt=ceiling)
+    changed = list(changed.order_by('change_seq').values_list('id', 'change_seq')[:limit + 1])
+    if master_id:
+        tombstones = tombstones.filter(master_id=master_id)
+    removed = list(tombstones.order_by('change_seq').values_list('lead_id', 'change_seq')[:limit + 1])
+
+    page = sorted([(seq, pk, False) for pk, seq in changed] + [(seq, pk, True) for pk, seq in removed])
+    has_more = len(page) > limit
+    page = page[:limit]
+    if not page:
+        return queryset.none(), [], since, False
+
+    token = page[-1][0]
+    changed_ids = [pk for _, pk, is_removed in page if not is_removed]
+    removed = {pk: seq for seq, pk, is_removed in page if is_removed}
+    # Надгробие от смены мастера не удаляет запись из общей выборки (и из выборки мастера,
+    # если запись к нему вернулась) — удаленными считаем только то, чего в выборке больше нет.
+    if removed:
+        for pk in scope.filter(id__in=list(removed)).values_list('id', flat=True):
+            del removed[pk]
+
+    leads = queryset.filter(id__in=changed_ids).order_by('change_seq')
+    return leads, sorted(removed.items(), key=lambda item: item[1]), token, has_more
+
+
+def purge_tombstones(before):
+    """Удаляет надгробия старше before; токены до последнего удаленного номера становятся недействительными."""
+    tombstones = LeadTombstone.objects.filter(created_at__lt=before)
+    purged_seq = tombstones.aggregate(seq=Max('change_seq'))['seq']
+    if purged_seq is None:
+        return 0
+    Counter.objects.update_or_create(key=LEAD_TOMBSTONES_PURGED_KEY, defaults={'value': purged_seq})
+    deleted, _ = tombstones.filter(change_seq__lte=purged_seq).delete()
+    return deleted
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .models import Counter
+from .reports import (
+    client_visit_split, financial_report, lead_status_counts, master_summary, new_clients_count, utilization_report
+)
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_WIDGET_ERROR = 'Не удалось получить данные виджета'
+
+
+def _leads_widget(start_date, end_date):
+    counts = lead_status_counts(start_date, end_date)
+    total = sum(counts.values())
+    decided = counts['confirmed'] + counts['rejected']
+    period_days = (end_date - start_date).days + 1
+    return {
+        **counts,
+        'total': total,
+        'average_per_day': round(total / period_days, 2),
+        'approval_rate_percent': round(counts['confirmed'] * 100 / decided, 2) if decided else 0,
+    }
+
+
+def _utilization_widget(start_date, end_date):
+    return utilization_report(start_date, end_date)['masters']
+
+
+# leads заменяет отчеты lead-statistics, average-bookings и leads-approval (одни и те же счетчики статусов),
+# masters — master-summary за период
+DASHBOARD_WIDGETS = {
+    'financial': lambda start_date, end_date: financial_report(start_date, end_date)['data'],
+    'leads': _leads_widget,
+    'new_clients': new_clients_count,
+    'client_stats': client_visit_split,
+    'total_clients': lambda start_date, end_date: Counter.get_value('clients_total'),
+    'masters': master_summary,
+    'utilization': _utilization_widget,
+}
+
+
+def _run_widget(name, start_date, end_date):
+    # Каждый виджет выполняется в своем потоке со своим соединением,
+    # поэтому соединение закрывается здесь, а не в request_finished.
+    started = time.perf_counter()
+    try:
+        return DASHBOARD_WIDGETS[name](start_date, end_date), None, time.perf_counter() - started
+    except Exception:
+        # текст ошибки БД клиенту не отдаем
+        logger.exception('Ошибка виджета дашборда %s', name)
+        return None, DASHBOARD_WIDGET_ERROR, time.perf_counter() - started
+    finally:
+        connections.close_all()
+
+
+async def _gather_widgets(start_date, end_date):
+    names = list(DASHBOARD_WIDGETS)
+    results = await asyncio.gather(*(
+        sync_to_async(_run_widget, thread_sensitive=False)(name, start_date, end_date)
+        for name in names
+    ))
+    return dict(zip(names, results))
+
+
+def build_dashboard(start_date, end_date):
+    """
+    Все виджеты дашборда за период. Независимые запросы выполняются параллельно;
+    ошибка одного виджета не ломает остальные. В DEBUG добавляется время виджетов в мс.
+    """
+    results = async_to_sync(_gather_widgets)(start_date, end_date)
+
+    payload = {'widgets': {}, 'errors': {}}
+    for name, (data, error, elapsed) in results.items():
+        if error is None:
+            payload['widgets'][name] = data
+        else:
+            payload['errors'][name] = error
+    if settings.DEBUG:
+        payload['timings'] = {name: round(elapsed * 1000, 1) for name, (_, _, elapsed) in results.items()}
+    return payload
@@ -0,0 +1,139 @@
+from collections import deque
+
+import orjson
+import redis
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max
+
+from core.renderers import ORJSON_OPTIONS, orjson_default
+from .changes import ChangesTokenExpired, lead_changes
+from .models import Lead, LeadTombstone
+
+LEAD_EVENTS_CHANNEL = 'leads:events'
+LEAD_EVENT_FIELDS = ('id', 'master_id', 'date_time', 'date', 'is_confirmed', 'change_seq')
+LEAD_EVENTS_HEARTBEAT = 15
+LEAD_EVENTS_BACKLOG_LIMIT = 1000
+LEAD_EVENTS_RETRY_MS = 3000
+
+_redis = None
+
+
+def lead_events_channel(master_id=None):
+    """Канал салона (все записи) или канал мастера."""
+    return f'{LEAD_EVENTS_CHANNEL}:master:{master_id}' if master_id else LEAD_EVENTS_CHANNEL
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        # Короткий таймаут: публикация идет после коммита в запросе и не должна его задерживать.
+        _redis = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _redis
+
+
+def lead_event(event_type, row):
+    lead = {name: row[name] for name in LEAD_EVENT_FIELDS if name != 'change_seq'}
+    return {'seq': row['change_seq'], 'type': event_type, 'lead': lead}
+
+
+def publish(event, master_id):
+    data = orjson.dumps(event, default=orjson_default, option=ORJSON_OPTIONS)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.publish(lead_events_channel(), data)
+    if master_id:
+        pipe.publish(lead_events_channel(master_id), data)
+    pipe.execute()
+
+
+def publish_lead_events(lead_ids, event_type):
+    # Номер изменения проставляет триггер, поэтому состояние читаем уже после коммита.
+    for row in Lead.objects.filter(id__in=lead_ids).values(*LEAD_EVENT_FIELDS):
+        publish(lead_event(event_type, row), row['master_id'])
+
+
+def publish_lead_removed(lead_id, master_id, only_master=False):
+    seq = LeadTombstone.objects.filter(lead_id=lead_id).aggregate(seq=Max('change_seq'))['seq'] or 0
+    event = {'seq': seq, 'type': 'deleted', 'lead': {'id': lead_id, 'master_id': master_id}}
+    if only_master:
+        # запись ушла к другому мастеру: для салона это обычное обновление
+        data = orjson.dumps(event, default=orjson_default, option=ORJSON_OPTIONS)
+        get_redis().publish(lead_events_channel(master_id), data)
+    else:
+        publish(event, master_id)
+
+
+def schedule_lead_events(lead_ids, event_type):
+    lead_ids = list(lead_ids)
+    if lead_ids:
+        transaction.on_commit(lambda: publish_lead_events(lead_ids, event_type), robust=True)
+
+
+def schedule_lead_removed(lead_id, master_id, only_master=False):
+    transaction.on_commit(lambda: publish_lead_removed(lead_id, master_id, only_master), robust=True)
+
+
+def backlog_events(since, master_id=None):
+    """
+    События после номера since из /leads/changes/ для переподключившегося клиента.
+    None — токен устарел или пропущено слишком много, клиенту нужно загрузить данные заново.
+    """
+    events = []
+    try:
+        while len(events) < LEAD_EVENTS_BACKLOG_LIMIT:
+            leads, deleted, since, has_more = lead_changes(since, Lead.objects.all(), master_id=master_id)
+            events.extend(lead_event('updated', row) for row in leads.values(*LEAD_EVENT_FIELDS))
+            events.extend(
+                {'seq': seq, 'type': 'deleted', 'lead': {'id': pk, 'master_id': master_id}} for pk, seq in deleted
+            )
+            if not has_more:
+                return sorted(events, key=lambda event: event['seq'])
+        return None
+    except ChangesTokenExpired:
+        return None
+    finally:
+        # выполняется в отдельном потоке, соединение закрываем сами, как в dashboard
+        connections.close_all()
+
+
+def format_sse(event):
+    data = orjson.dumps(event, default=orjson_default, option=ORJSON_OPTIONS).decode()
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def lead_event_stream(master_id=None, last_seq=None):
+    """
+    Поток text/event-stream: сначала пропущенные события после last_seq (из БД), затем живые из Redis.
+    Подписка оформляется до чтения пропущенного, поэтому событие на стыке не теряется,
+    а повтор отбрасывается по seq.
+    """
+    client = aioredis.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(lead_events_channel(master_id))
+    sent = deque(maxlen=LEAD_EVENTS_BACKLOG_LIMIT)
+    try:
+        yield f'retry: {LEAD_EVENTS_RETRY_MS}\n\n'
+        if last_seq is not None:
+            backlog = await sync_to_async(backlog_events, thread_sensitive=False)(last_seq, master_id)
+            if backlog is None:
+                yield format_sse({'seq': last_seq, 'type': 'reset', 'lead': None})
+            for event in backlog or ():
+                sent.append(event['seq'])
+                yield format_sse(event)
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=LEAD_EVENTS_HEARTBEAT)
+            if message is None:
+                yield ': ping\n\n'
+                continue
+            event = orjson.loads(message['data'])
+            if event['seq'] and event['seq'] in sent:
+                continue
+            sent.append(event['seq'])
+            yield format_sse(event)
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,144 @@
+import csv
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from core.routers import read_db_alias
+from .models import Client, Lead
+from .reports import datetime_range
+
+CHUNK_SIZE = 2000
+
+LEAD_EXPORT_COLUMNS = (
+    ('id', 'ID'),
+    ('date_time', 'Дата и время'),
+    ('date', 'Дата'),
+    ('client_display_name', 'Клиент'),
+    ('phone', 'Телефон'),
+    ('master_id', 'ID мастера'),
+    ('master__first_name', 'Имя мастера'),
+    ('master__last_name', 'Фамилия мастера'),
+    ('service_names', 'Услуги'),
+    ('total_price', 'Сумма'),
+    ('prepayment', 'Предоплата'),
+    ('prepayment_paid', 'Предоплата получена'),
+    ('is_confirmed', 'Подтверждено'),
+    ('created_at', 'Создано'),
+)
+
+CLIENT_EXPORT_COLUMNS = (
+    ('id', 'ID'),
+    ('name', 'Имя клиента'),
+    ('phone', 'Номер телефона'),
+    ('created_at', 'Создан'),
+)
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: отдает строку вместо записи в память."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, Decimal):
+        return float(value)
+    if value is None:
+        return ''
+    return value if isinstance(value, (int, float, str, bool)) else str(value)
+
+
+def export_leads_queryset(start_date=None, end_date=None, master_ids=None):
+    queryset = Lead.objects.all()
+    if start_date and end_date:
+        start_dt, end_dt = datetime_range(start_date, end_date)
+        queryset = queryset.filter(
+            Q(date_time__gte=start_dt, date_time__lt=end_dt) |
+            Q(date_time__isnull=True, date__gte=start_date, date__lte=end_date)
+        )
+    if master_ids:
+        queryset = queryset.filter(master_id__in=master_ids)
+
+    fields = [name for name, _ in LEAD_EXPORT_COLUMNS if name not in ('service_names', 'total_price')]
+    return (
+        queryset
+        .annotate(client_display_name=Coalesce('client__name', 'client_name', Value('')))
+        .order_by('id')
+        .values(*fields)
+        .annotate(
+            service_names=StringAgg('services__name', delimiter=', ', distinct=True, default=Value('')),
+            total_price=Sum('services__price')
+        )
+    )
+
+
+def export_clients_queryset(start_date=None, end_date=None, master_ids=None):
+    queryset = Client.objects.all()
+    if start_date and end_date:
+        start_dt, end_dt = datetime_range(start_date, end_date)
+        queryset = queryset.filter(created_at__gte=start_dt, created_at__lt=end_dt)
+    if master_ids:
+        queryset = queryset.filter(lead__master_id__in=master_ids).distinct()
+    return queryset.order_by('id').values(*(name for name, _ in CLIENT_EXPORT_COLUMNS))
+
+
+def iter_rows(rows, columns):
+    """Строки в порядке колонок. rows — итератор словарей (values() или данные отчета)."""
+    names = [name for name, _ in columns]
+    for row in rows:
+        yield [_cell(row.get(name)) for name in names]
+
+
+def stream_csv(rows, columns, filename):
+    writer = csv.writer(Echo())
+
+    def generate():
+        yield '\ufeff'
+        yield writer.writerow([title for _, title in columns])
+        for row in iter_rows(rows, columns):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_response(rows, columns, filename):
+    # write_only книга сбрасывает строки во временный файл по мере добавления,
+    # поэтому память не зависит от количества строк.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([title for _, title in columns])
+    for row in iter_rows(rows, columns):
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+def export_response(rows, columns, filename, output='csv'):
+    if output == 'xlsx':
+        return xlsx_response(rows, columns, filename)
+    return stream_csv(rows, columns, filename)
+
+
+def queryset_rows(queryset):
+    # Алиас фиксируется сразу: итерация StreamingHttpResponse идет уже после выхода из view.
+    return queryset.using(read_db_alias()).iterator(chunk_size=CHUNK_SIZE)
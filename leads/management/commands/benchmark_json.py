@@ -0,0 +1,41 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import ORJSONRenderer
+from leads.models import Lead
+from leads.serializers import LeadCompactSerializer, LeadSerializer
+
+
+class Command(BaseCommand):
+    help = 'Сравнение скорости JSONRenderer (DRF) и ORJSONRenderer на данных записей из БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='Количество записей в ответе')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество повторов рендера')
+
+    def handle(self, *args, **options):
+        limit, repeat = options['limit'], options['repeat']
+        payloads = {
+            'LeadSerializer': LeadSerializer(Lead.objects.with_relations()[:limit], many=True).data,
+            'LeadCompactSerializer': LeadCompactSerializer(Lead.objects.compact()[:limit], many=True).data,
+        }
+        renderers = {'drf': JSONRenderer(), 'orjson': ORJSONRenderer()}
+
+        for name, data in payloads.items():
+            if not data:
+                self.stdout.write(self.style.WARNING(f'{name}: нет записей, запустите generate_test_data'))
+                continue
+
+            timings = {}
+            for renderer_name, renderer in renderers.items():
+                size = len(renderer.render(data))
+                seconds = min(timeit.repeat(lambda: renderer.render(data), number=1, repeat=repeat))
+                timings[renderer_name] = seconds
+                self.stdout.write(
+                    f'{name} [{len(data)} записей] {renderer_name}: {seconds * 1000:.2f} мс, {size / 1024:.1f} КБ'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: orjson быстрее в {timings["drf"] / timings["orjson"]:.1f} раз'
+            ))
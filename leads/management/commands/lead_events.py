@@ -0,0 +1,25 @@
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leads.events import lead_events_channel
+
+
+class Command(BaseCommand):
+    help = 'Печатает события по записям из Redis pub/sub (для проверки push-канала на локальном Redis)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--master', help='UUID мастера; без него — канал всего салона')
+
+    def handle(self, *args, **options):
+        channel = lead_events_channel(options['master'])
+        pubsub = redis.Redis.from_url(settings.REDIS_URL).pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        self.stdout.write(self.style.SUCCESS(f'Подписка на {channel}, Ctrl+C для выхода'))
+        try:
+            for message in pubsub.listen():
+                self.stdout.write(message['data'].decode())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pubsub.close()
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:11
+
+from django.conf import settings
+import django.db.models.deletion
+from django.db import migrations, models
+
+REVENUE_DAILY_SQL = f"""
+CREATE MATERIALIZED VIEW leads_revenue_daily AS
+SELECT row_number() OVER (ORDER BY day, master_id, service_id) AS id, t.*
+FROM (
+    SELECT (l.date_time AT TIME ZONE '{settings.TIME_ZONE}')::date AS day,
+           l.master_id,
+           ls.service_id,
+           COUNT(*)::integer AS leads_count,
+           SUM(s.price) AS revenue
+    FROM leads_lead l
+    JOIN leads_lead_services ls ON ls.lead_id = l.id
+    JOIN leads_service s ON s.id = ls.service_id
+    WHERE l.is_confirmed AND l.date_time IS NOT NULL
+    GROUP BY 1, 2, 3
+) t;
+CREATE UNIQUE INDEX leads_revenue_daily_key ON leads_revenue_daily (day, master_id, service_id);
+"""
+
+STATUS_DAILY_SQL = f"""
+CREATE MATERIALIZED VIEW leads_status_daily AS
+SELECT row_number() OVER (ORDER BY day, status) AS id, t.*
+FROM (
+    SELECT (date_time AT TIME ZONE '{settings.TIME_ZONE}')::date AS day,
+           CASE WHEN is_confirmed THEN 'confirmed'
+                WHEN NOT is_confirmed THEN 'rejected'
+                ELSE 'pending' END AS status,
+           COUNT(*)::integer AS leads_count
+    FROM leads_lead
+    WHERE date_time IS NOT NULL
+    GROUP BY 1, 2
+) t;
+CREATE UNIQUE INDEX leads_status_daily_key ON leads_status_daily (day, status);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0003_report_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(REVENUE_DAILY_SQL, 'DROP MATERIALIZED VIEW IF EXISTS leads_revenue_daily;'),
+        migrations.RunSQL(STATUS_DAILY_SQL, 'DROP MATERIALIZED VIEW IF EXISTS leads_status_daily;'),
+        migrations.CreateModel(
+            name='LeadStatusDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('confirmed', 'Подтверждена'), ('rejected', 'Отклонена')], max_length=16)),
+                ('leads_count', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'leads_status_daily',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('leads_count', models.IntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='leads.service')),
+            ],
+            options={
+                'db_table': 'leads_revenue_daily',
+                'managed': False,
+            },
+        ),
+    ]
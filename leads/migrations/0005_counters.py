@@ -0,0 +1,101 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:15
+
+from django.db import migrations, models
+
+COUNTER_TRIGGERS_SQL = """
+CREATE FUNCTION leads_counter_add(counter_key text, delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO leads_counter (key, value) VALUES (counter_key, delta)
+    ON CONFLICT (key) DO UPDATE SET value = leads_counter.value + EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION leads_lead_status(is_confirmed boolean) RETURNS text AS $$
+    SELECT CASE WHEN is_confirmed THEN 'confirmed'
+                WHEN NOT is_confirmed THEN 'rejected'
+                ELSE 'pending' END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION leads_client_counter() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM leads_counter_add('clients_total', 1);
+    ELSE
+        PERFORM leads_counter_add('clients_total', -1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER leads_client_counter
+AFTER INSERT OR DELETE ON leads_client
+FOR EACH ROW EXECUTE FUNCTION leads_client_counter();
+
+CREATE FUNCTION leads_lead_counter() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM leads_counter_add('leads_total', 1);
+        PERFORM leads_counter_add('leads_status:' || leads_lead_status(NEW.is_confirmed), 1);
+        PERFORM leads_counter_add('leads_master:' || NEW.master_id, 1);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM leads_counter_add('leads_total', -1);
+        PERFORM leads_counter_add('leads_status:' || leads_lead_status(OLD.is_confirmed), -1);
+        PERFORM leads_counter_add('leads_master:' || OLD.master_id, -1);
+    ELSE
+        IF NEW.is_confirmed IS DISTINCT FROM OLD.is_confirmed THEN
+            PERFORM leads_counter_add('leads_status:' || leads_lead_status(OLD.is_confirmed), -1);
+            PERFORM leads_counter_add('leads_status:' || leads_lead_status(NEW.is_confirmed), 1);
+        END IF;
+        IF NEW.master_id IS DISTINCT FROM OLD.master_id THEN
+            PERFORM leads_counter_add('leads_master:' || OLD.master_id, -1);
+            PERFORM leads_counter_add('leads_master:' || NEW.master_id, 1);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER leads_lead_counter
+AFTER INSERT OR DELETE OR UPDATE OF is_confirmed, master_id ON leads_lead
+FOR EACH ROW EXECUTE FUNCTION leads_lead_counter();
+
+INSERT INTO leads_counter (key, value)
+SELECT 'clients_total', COUNT(*) FROM leads_client;
+INSERT INTO leads_counter (key, value)
+SELECT 'leads_total', COUNT(*) FROM leads_lead;
+INSERT INTO leads_counter (key, value)
+SELECT 'leads_status:' || leads_lead_status(is_confirmed), COUNT(*) FROM leads_lead GROUP BY 1;
+INSERT INTO leads_counter (key, value)
+SELECT 'leads_master:' || master_id, COUNT(*) FROM leads_lead GROUP BY master_id;
+"""
+
+DROP_COUNTER_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS leads_lead_counter ON leads_lead;
+DROP TRIGGER IF EXISTS leads_client_counter ON leads_client;
+DROP FUNCTION IF EXISTS leads_lead_counter();
+DROP FUNCTION IF EXISTS leads_client_counter();
+DROP FUNCTION IF EXISTS leads_lead_status(boolean);
+DROP FUNCTION IF EXISTS leads_counter_add(text, bigint);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0004_report_materialized_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Счетчик',
+                'verbose_name_plural': 'Счетчики',
+            },
+        ),
+        migrations.RunSQL(COUNTER_TRIGGERS_SQL, DROP_COUNTER_TRIGGERS_SQL),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+LEAD_CHANGES_SQL = """
+CREATE SEQUENCE leads_lead_change_seq;
+
+UPDATE leads_lead SET change_seq = nextval('leads_lead_change_seq'), updated_at = created_at;
+
+-- Номера выдаются под транзакционной блокировкой: пишущие транзакции по записям выстраиваются
+-- друг за другом, и номер, который видит клиент, не может быть обойден более поздним коммитом.
+CREATE FUNCTION leads_lead_next_change() RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('leads_lead_change_seq'));
+    RETURN nextval('leads_lead_change_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION leads_lead_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := leads_lead_next_change();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER leads_lead_touch
+BEFORE INSERT OR UPDATE ON leads_lead
+FOR EACH ROW EXECUTE FUNCTION leads_lead_touch();
+
+CREATE FUNCTION leads_lead_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO leads_leadtombstone (lead_id, master_id, change_seq, created_at)
+    VALUES (OLD.id, OLD.master_id, leads_lead_next_change(), now());
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER leads_lead_deleted
+AFTER DELETE ON leads_lead
+FOR EACH ROW EXECUTE FUNCTION leads_lead_tombstone();
+
+CREATE TRIGGER leads_lead_master_changed
+AFTER UPDATE OF master_id ON leads_lead
+FOR EACH ROW WHEN (OLD.master_id IS DISTINCT FROM NEW.master_id)
+EXECUTE FUNCTION leads_lead_tombstone();
+
+-- Смена услуг меняет запись для клиентов календаря: обновляем строку лида, триггер выше даст новый номер.
+CREATE FUNCTION leads_lead_services_touch() RETURNS trigger AS $$
+BEGIN
+    UPDATE leads_lead SET updated_at = now() WHERE id = COALESCE(NEW.lead_id, OLD.lead_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER leads_lead_services_touch
+AFTER INSERT OR DELETE ON leads_lead_services
+FOR EACH ROW EXECUTE FUNCTION leads_lead_services_touch();
+"""
+
+DROP_LEAD_CHANGES_SQL = """
+DROP TRIGGER IF EXISTS leads_lead_services_touch ON leads_lead_services;
+DROP TRIGGER IF EXISTS leads_lead_master_changed ON leads_lead;
+DROP TRIGGER IF EXISTS leads_lead_deleted ON leads_lead;
+DROP TRIGGER IF EXISTS leads_lead_touch ON leads_lead;
+DROP FUNCTION IF EXISTS leads_lead_services_touch();
+DROP FUNCTION IF EXISTS leads_lead_tombstone();
+DROP FUNCTION IF EXISTS leads_lead_touch();
+DROP FUNCTION IF EXISTS leads_lead_next_change();
+DROP SEQUENCE IF EXISTS leads_lead_change_seq;
+"""
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0007_calendar_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lead_id', models.BigIntegerField()),
+                ('master_id', models.UUIDField(null=True)),
+                ('change_seq', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Удаленный лид',
+                'verbose_name_plural': 'Удаленные лиды',
+            },
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['change_seq'], name='leads_lead_change_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leadtombstone',
+            index=models.Index(fields=['change_seq'], name='leads_tombstone_seq_idx'),
+        ),
+        migrations.RunSQL(LEAD_CHANGES_SQL, DROP_LEAD_CHANGES_SQL),
+    ]
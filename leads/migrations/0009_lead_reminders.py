@@ -0,0 +1,62 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Напоминания по уже прошедшим записям помечаются отправленными, чтобы их не разослали после выкладки.
+# Триггер номера изменений больше не срабатывает на отметку об отправке напоминания:
+# для календарей запись от этого не меняется.
+LEAD_REMINDERS_SQL = """
+UPDATE leads_lead
+SET remind_at = date_time - reminder_minutes * interval '1 minute',
+    reminder_sent_at = CASE WHEN date_time <= now() THEN now() END
+WHERE date_time IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION leads_lead_touch() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND to_jsonb(NEW) - 'reminder_sent_at' - 'change_seq' = to_jsonb(OLD) - 'reminder_sent_at' - 'change_seq' THEN
+        RETURN NEW;
+    END IF;
+    NEW.change_seq := leads_lead_next_change();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+RESTORE_LEAD_TOUCH_SQL = """
+CREATE OR REPLACE FUNCTION leads_lead_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := leads_lead_next_change();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0008_lead_changes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='remind_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(condition=models.Q(('reminder_sent_at__isnull', True)), fields=['remind_at'], name='leads_lead_remind_due_idx'),
+        ),
+        migrations.RunSQL(LEAD_REMINDERS_SQL, RESTORE_LEAD_TOUCH_SQL),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:53
+
+from django.db import migrations, models
+
+# Триггеры счетчиков (0005) вызывают leads_counter_add: теперь она только дописывает строку,
+# без UPDATE горячих строк leads_counter, которые держали блокировку до коммита записи.
+COUNTER_DELTAS_SQL = """
+CREATE OR REPLACE FUNCTION leads_counter_add(counter_key text, delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO leads_counterdelta (key, delta) VALUES (counter_key, delta);
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+RESTORE_COUNTER_ADD_SQL = """
+INSERT INTO leads_counter (key, value)
+SELECT key, SUM(delta) FROM leads_counterdelta GROUP BY key
+ON CONFLICT (key) DO UPDATE SET value = leads_counter.value + EXCLUDED.value;
+DELETE FROM leads_counterdelta;
+
+CREATE OR REPLACE FUNCTION leads_counter_add(counter_key text, delta bigint) RETURNS void AS $$
+BEGIN
+    INSERT INTO leads_counter (key, value) VALUES (counter_key, delta)
+    ON CONFLICT (key) DO UPDATE SET value = leads_counter.value + EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0009_lead_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('delta', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Изменение счетчика',
+                'verbose_name_plural': 'Изменения счетчиков',
+                'indexes': [models.Index(fields=['key'], name='leads_counterdelta_key_idx')],
+            },
+        ),
+        migrations.RunSQL(COUNTER_DELTAS_SQL, RESTORE_COUNTER_ADD_SQL),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-19 18:05
+
+from django.db import migrations
+
+# Номер изменения без общей блокировки: старшие биты — id транзакции (pg_current_xact_id),
+# младшие 20 бит — из последовательности, чтобы номера внутри одной транзакции различались.
+# Номера упорядочены по транзакциям, поэтому читатель отдает только номера ниже
+# pg_snapshot_xmin(pg_current_snapshot()) << 20 (см. leads/changes.py): все транзакции с меньшим id
+# уже завершены, и более поздний коммит не может получить номер ниже уже отданного клиенту.
+# Старые номера пересчитываются в новой схеме, а прежние токены объявляются устаревшими (ответ 410).
+LEAD_CHANGE_XID_SQL = """
+CREATE OR REPLACE FUNCTION leads_lead_next_change() RETURNS bigint AS $$
+    SELECT (pg_current_xact_id()::text::bigint << 20) | (nextval('leads_lead_change_seq') & 1048575);
+$$ LANGUAGE sql;
+
+UPDATE leads_lead SET change_seq = leads_lead_next_change();
+UPDATE leads_leadtombstone SET change_seq = leads_lead_next_change();
+
+DELETE FROM leads_counterdelta WHERE key = 'lead_changes_purged_seq';
+INSERT INTO leads_counter (key, value) VALUES ('lead_changes_purged_seq', pg_current_xact_id()::text::bigint << 20)
+ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value;
+"""
+
+RESTORE_LEAD_NEXT_CHANGE_SQL = """
+SELECT setval('leads_lead_change_seq', GREATEST(
+    (SELECT COALESCE(MAX(change_seq), 0) FROM leads_lead),
+    (SELECT COALESCE(MAX(change_seq), 0) FROM leads_leadtombstone),
+    1
+));
+
+CREATE OR REPLACE FUNCTION leads_lead_next_change() RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('leads_lead_change_seq'));
+    RETURN nextval('leads_lead_change_seq');
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0010_counter_deltas'),
+    ]
+
+    operations = [
+        migrations.RunSQL(LEAD_CHANGE_XID_SQL, RESTORE_LEAD_NEXT_CHANGE_SQL),
+    ]
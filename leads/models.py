@@ -1,19 +1,77 @@
 from datetime import timedelta
 import re
+import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Count, DecimalField, Max, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
 
 User = settings.AUTH_USER_MODEL
 
+
+class ClientQuerySet(models.QuerySet):
+    def with_stats(self):
+        """
+        Визиты (подтвержденные записи), их сумма и дата последнего визита —
+        коррелированными подзапросами, без запросов на каждого клиента.
+        """
+        visits = Lead.objects.filter(client=OuterRef('pk'), is_confirmed=True).order_by().values('client')
+        return self.annotate(
+            visits_count=Coalesce(Subquery(visits.annotate(total=Count('id')).values('total')), 0),
+            total_sum=Coalesce(
+                Subquery(visits.annotate(total=Sum('services__price')).values('total')),
+                Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            last_visit=Subquery(visits.annotate(last=Max('date_time')).values('last')),
+        )
+
+
+class ServiceQuerySet(models.QuerySet):
+    def with_relations(self):
+        """Связи, которые отдает ServiceSerializer (включая parent_services вложенных услуг)."""
+        nested_services = Service.objects.prefetch_related('parent_services')
+        return self.prefetch_related(
+            Prefetch('additional_services', queryset=nested_services),
+            Prefetch('parent_services', queryset=nested_services),
+        )
+
+
+class LeadQuerySet(models.QuerySet):
+    def with_relations(self):
+        """Все связи, которые отдает LeadSerializer, загружаются фиксированным числом запросов."""
+        return self.select_related('master').prefetch_related(
+            Prefetch('client', queryset=Client.objects.with_stats()),
+            Prefetch('services', queryset=Service.objects.with_relations()),
+        )
+
+    def compact(self):
+        """Плоские словари для календарей: только время, клиент, мастер и названия услуг."""
+        # В запросах с GROUP BY Django не применяет Meta.ordering — задаем порядок явно, как у полного вида
+        queryset = self if self.query.order_by else self.order_by(*self.model._meta.ordering)
+        return queryset.values('id', 'date_time', 'date', 'master_id', 'is_confirmed', 'created_at').annotate(
+            client_display_name=Coalesce('client__name', 'client_name'),
+            client_phone=Coalesce('phone', 'client__phone'),
+            duration=Coalesce(Sum('services__duration'), 0),
+            service_names=ArrayAgg('services__name', distinct=True, default=Value([])),
+        )
+
+
 class Client(models.Model):
     phone = models.CharField(max_length=20, unique=True, verbose_name="Номер телефона")
     name = models.CharField(max_length=255, verbose_name="Имя клиента")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ClientQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Клиент"
         verbose_name_plural = "Клиенты"
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='leads_client_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
@@ -32,6 +90,8 @@ class Service(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ServiceQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Услуга"
         verbose_name_plural = "Услуги"
@@ -66,11 +126,34 @@ class Lead(models.Model):
     date = models.DateField(null=True, blank=True)
     reminder_minutes = models.IntegerField(choices=REMINDER_CHOICES, default=60, verbose_name="Время напоминания")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Номер изменения: id транзакции и номер из leads_lead_change_seq, проставляется триггером (миграции 0008, 0011)
+    change_seq = models.BigIntegerField(default=0, editable=False)
+    # date_time - reminder_minutes, пересчитывается в save(); напоминания рассылает send_due_reminders
+    remind_at = models.DateTimeField(null=True, blank=True, editable=False)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LeadQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Лид"
         verbose_name_plural = "Лиды"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='leads_lead_created_idx'),
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(is_confirmed__isnull=True),
+                name='leads_lead_pending_idx'
+            ),
+            models.Index(fields=['date_time'], name='leads_lead_date_time_idx'),
+            models.Index(fields=['master', 'date_time'], name='leads_lead_master_time_idx'),
+            models.Index(fields=['date'], condition=models.Q(date_time__isnull=True), name='leads_lead_date_only_idx'),
+            models.Index(fields=['change_seq'], name='leads_lead_change_seq_idx'),
+            models.Index(
+                fields=['remind_at'], condition=models.Q(reminder_sent_at__isnull=True),
+                name='leads_lead_remind_due_idx'
+            ),
+        ]
     
     def __str__(self):
         client_info = self.client.name if self.client else self.client_name or self.phone or "Без имени"
@@ -88,4 +171,137 @@ class Lead(models.Model):
             )
             self.client = client
 
+        remind_at = self.date_time - timedelta(minutes=self.reminder_minutes) if self.date_time else None
+        if remind_at != self.remind_at:
+            # время записи или напоминания изменилось — напоминание нужно отправить заново
+            self.remind_at = remind_at
+            self.reminder_sent_at = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'remind_at', 'reminder_sent_at'}
+
         super().save(*args, **kwargs)
+
+
+class LeadTombstone(models.Model):
+    """
+    Удаленная запись или запись, ушедшая к другому мастеру (master_id — прежний мастер).
+    Создается триггером с номером из той же последовательности, что и Lead.change_seq.
+    """
+    lead_id = models.BigIntegerField()
+    master_id = models.UUIDField(null=True)
+    change_seq = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Удаленный лид"
+        verbose_name_plural = "Удаленные лиды"
+        indexes = [
+            models.Index(fields=['change_seq'], name='leads_tombstone_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.lead_id} (#{self.change_seq})"
+
+
+class ReportJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    )
+
+    uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report_type = models.CharField(max_length=32, verbose_name="Тип отчета")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name="Результат")
+    csv_file = models.FileField(upload_to='reports/', null=True, blank=True, verbose_name="CSV")
+    error = models.TextField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        'users.User', on_delete=models.SET_NULL, null=True, blank=True, related_name="report_jobs"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Задача отчета"
+        verbose_name_plural = "Задачи отчетов"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.report_type} ({self.get_status_display()})"
+
+
+class RevenueDaily(models.Model):
+    """Материализованное представление leads_revenue_daily: выручка подтвержденных записей по дням."""
+    day = models.DateField()
+    master = models.ForeignKey('users.User', on_delete=models.DO_NOTHING, related_name='+')
+    service = models.ForeignKey(Service, on_delete=models.DO_NOTHING, related_name='+')
+    leads_count = models.IntegerField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        managed = False
+        db_table = 'leads_revenue_daily'
+
+
+class LeadStatusDaily(models.Model):
+    """Материализованное представление leads_status_daily: количество записей по статусам и дням."""
+    STATUS_CHOICES = (
+        ('pending', 'Ожидает'),
+        ('confirmed', 'Подтверждена'),
+        ('rejected', 'Отклонена'),
+    )
+
+    day = models.DateField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES)
+    leads_count = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'leads_status_daily'
+
+
+class Counter(models.Model):
+    """
+    Счетчики для дешевых итогов. Ведутся триггерами PostgreSQL (миграции 0005, 0010):
+    clients_total, leads_total, leads_status:<pending|confirmed|rejected>, leads_master:<uuid>.
+    lead_changes_purged_seq — до какого номера изменений удалены LeadTombstone (задача purge_lead_tombstones).
+
+    Триггеры не обновляют строки счетчиков, а дописывают изменения в CounterDelta, поэтому
+    параллельные записи не ждут друг друга. Значение — value плюс еще не свернутые изменения.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Счетчик"
+        verbose_name_plural = "Счетчики"
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
+
+    @classmethod
+    def get_value(cls, key):
+        value = cls.objects.filter(key=key).values('value')
+        result = CounterDelta.objects.filter(key=key).aggregate(
+            value=Coalesce(Sum('delta'), 0) + Coalesce(Subquery(value), 0)
+        )
+        return result['value']
+
+
+class CounterDelta(models.Model):
+    """Изменения счетчиков от триггеров; задача compact_counters раз в минуту сворачивает их в Counter."""
+    key = models.CharField(max_length=100)
+    delta = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = "Изменение счетчика"
+        verbose_name_plural = "Изменения счетчиков"
+        indexes = [
+            models.Index(fields=['key'], name='leads_counterdelta_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key}: {self.delta:+d}"
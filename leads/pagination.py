@@ -0,0 +1,139 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Counter
+
+
+class UnlimitedLimitOffsetPagination(LimitOffsetPagination):
+    default_limit = 10
+    max_limit = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get('limit') == 'all':
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу (created_at, id) от новых к старым.
+    Следующая страница выбирается условием WHERE (created_at, id) < (курсор),
+    поэтому любая страница стоит столько же, сколько первая.
+
+    count отдается только для нефильтрованных списков из таблицы счетчиков,
+    для остальных — null (без COUNT(*)).
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = api_settings.PAGE_SIZE or 10
+    max_limit = 100
+    invalid_cursor_message = 'Неверный курсор'
+    counter_keys = {
+        'leads.client': 'clients_total',
+        'leads.lead': 'leads_total',
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.count = self.get_count(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        if cursor:
+            created_at, pk, _ = cursor
+            if reverse:
+                position = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            else:
+                position = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            queryset = queryset.filter(position)
+
+        ordering = ('created_at', 'id') if reverse else ('-created_at', '-id')
+        page = list(queryset.order_by(*ordering)[:self.limit + 1])
+        has_more = len(page) > self.limit
+        page = page[:self.limit]
+        if reverse:
+            page.reverse()
+
+        # Возврат назад всегда возможен, если пришли по курсору вперед, и наоборот.
+        self.has_next = (has_more if not reverse else True) and bool(page)
+        self.has_previous = (has_more if reverse else bool(cursor)) and bool(page)
+        self.page = page
+        return page
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def get_count(self, queryset):
+        key = self.counter_keys.get(queryset.model._meta.label_lower)
+        if key and not queryset.query.where:
+            return Counter.get_value(key)
+        return None
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, pk, reverse = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(pk), reverse == '1'
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, item, reverse=False):
+        if isinstance(item, dict):
+            created_at, pk = item['created_at'], item['id']
+        else:
+            created_at, pk = item.created_at, item.pk
+        raw = f'{created_at.isoformat()}|{pk}|{int(reverse)}'
+        encoded = base64.urlsafe_b64encode(raw.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        return self.encode_cursor(self.page[-1]) if self.has_next else None
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.page[0], reverse=True) if self.has_previous else None
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param, 'required': False, 'in': 'query',
+                'description': 'Курсор из next/previous', 'schema': {'type': 'string'},
+            },
+            {
+                'name': self.limit_query_param, 'required': False, 'in': 'query',
+                'description': f'Размер страницы (до {self.max_limit})', 'schema': {'type': 'integer'},
+            },
+        ]
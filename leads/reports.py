@@ -0,0 +1,517 @@
+import csv
+import io
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from core.routers import read_db_alias
+from users.models import User
+
+from .models import Client, Lead, LeadStatusDaily, RevenueDaily
+
+REPORT_CACHE_PREFIX = 'reports'
+REPORT_CACHE_TIMEOUT = 60 * 10
+CLOSED_MONTH_CACHE_TIMEOUT = 60 * 60 * 24 * 35
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def resolve_period(data, default_type='month'):
+    """
+    Возвращает (start_date, end_date, type) по параметрам запроса.
+    Явные start_date/end_date имеют приоритет над type/date.
+    """
+    if data.get('start_date') and data.get('end_date'):
+        start_date = parse_date(data['start_date'])
+        end_date = parse_date(data['end_date'])
+        if start_date > end_date:
+            raise ValueError('start_date не может быть позже end_date')
+        return start_date, end_date, 'custom'
+
+    report_type = data.get('type') or default_type
+    base_date = parse_date(data['date']) if data.get('date') else timezone.now().date()
+
+    if report_type == 'day':
+        start_date = end_date = base_date
+    elif report_type == 'week':
+        start_date = base_date - timedelta(days=base_date.weekday())
+        end_date = start_date + timedelta(days=6)
+    elif report_type == 'month':
+        start_date = base_date.replace(day=1)
+        end_date = start_date + relativedelta(months=1) - timedelta(days=1)
+    elif report_type == 'quarter':
+        start_date = base_date.replace(day=1)
+        end_date = start_date + relativedelta(months=3) - timedelta(days=1)
+    elif report_type == 'year':
+        start_date = base_date.replace(month=1, day=1)
+        end_date = base_date.replace(month=12, day=31)
+    else:
+        raise ValueError(f'Неверный тип периода: {report_type}')
+
+    return start_date, end_date, report_type
+
+
+def datetime_range(start_date, end_date):
+    """Полуоткрытый интервал [start, end) в текущей таймзоне для фильтрации по date_time."""
+    start_dt = timezone.make_aware(datetime.combine(start_date, time.min))
+    end_dt = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start_dt, end_dt
+
+
+def cached_report(key, builder, timeout=REPORT_CACHE_TIMEOUT, refresh=False):
+    cache_key = f'{REPORT_CACHE_PREFIX}:{key}'
+    result = None if refresh else cache.get(cache_key)
+    if result is None:
+        result = builder()
+        cache.set(cache_key, result, timeout)
+    return result
+
+
+def fetch_dicts(sql, params):
+    with connections[read_db_alias()].cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def lead_status_counts(start_date, end_date):
+    """Количество записей по статусам (pending/confirmed/rejected) из leads_status_daily."""
+    counts = dict.fromkeys(('pending', 'confirmed', 'rejected'), 0)
+    counts.update(
+        LeadStatusDaily.objects.filter(day__gte=start_date, day__lte=end_date)
+        .values('status')
+        .annotate(total=Sum('leads_count'))
+        .values_list('status', 'total')
+    )
+    return counts
+
+
+def new_clients_count(start_date, end_date):
+    start_dt, end_dt = datetime_range(start_date, end_date)
+    return Client.objects.filter(created_at__gte=start_dt, created_at__lt=end_dt).count()
+
+
+def master_summary(start_date, end_date):
+    """Подтвержденные записи, клиенты и выручка каждого мастера за период — одним запросом."""
+    start_dt, end_dt = datetime_range(start_date, end_date)
+    period = Q(leads__is_confirmed=True, leads__date_time__gte=start_dt, leads__date_time__lt=end_dt)
+    masters = (
+        User.objects.filter(is_employee=True)
+        .annotate(
+            total_leads=Count('leads', filter=period, distinct=True),
+            total_clients=Count('leads__client', filter=period, distinct=True),
+            total_earnings=Sum('leads__services__price', filter=period),
+        )
+        .order_by('first_name', 'last_name')
+        .values('uuid', 'first_name', 'last_name', 'total_leads', 'total_clients', 'total_earnings')
+    )
+    return [{
+        'uuid': str(master['uuid']),
+        'full_name': f"{master['first_name']} {master['last_name']}",
+        'total_clients': master['total_clients'],
+        'total_earnings': float(master['total_earnings'] or 0),
+        'total_leads': master['total_leads'],
+    } for master in masters]
+
+
+def client_visit_split(start_date, end_date):
+    """
+    Подтвержденные записи периода: у новых клиентов (первый подтвержденный визит
+    попадает в период) и у вернувшихся. Один запрос вместо запроса на каждую запись.
+    """
+    start_dt, end_dt = datetime_range(start_date, end_date)
+    first_visit = (
+        Lead.objects.filter(client=OuterRef('client'), is_confirmed=True)
+        .order_by('date_time')
+        .values('date_time')[:1]
+    )
+    totals = (
+        Lead.objects.filter(
+            is_confirmed=True, client__isnull=False, date_time__gte=start_dt, date_time__lt=end_dt
+        )
+        .annotate(first_visit=Subquery(first_visit))
+        .aggregate(
+            total=Count('id'),
+            new=Count('id', filter=Q(first_visit__gte=start_dt, first_visit__lt=end_dt))
+        )
+    )
+    return {'new_clients': totals['new'], 'returning_clients': totals['total'] - totals['new']}
+
+
+def financial_report(start_date, end_date, group_by='day'):
+    totals = dict(
+        RevenueDaily.objects.filter(day__gte=start_date, day__lte=end_date)
+        .values('day')
+        .annotate(total=Sum('revenue'))
+        .values_list('day', 'total')
+    )
+
+    result_data = []
+    if group_by == 'day':
+        current_date = start_date
+        while current_date <= end_date:
+            result_data.append({
+                'date': current_date.strftime('%Y-%m-%d'),
+                'total_amount': float(totals.get(current_date) or 0)
+            })
+            current_date += timedelta(days=1)
+
+    elif group_by == 'week':
+        current_start = start_date
+        while current_start <= end_date:
+            current_end = min(current_start + timedelta(days=6), end_date)
+            total = sum(
+                (amount or Decimal('0.00') for day, amount in totals.items() if current_start <= day <= current_end),
+                Decimal('0.00')
+            )
+            result_data.append({
+                'week_start': current_start.strftime('%Y-%m-%d'),
+                'week_end': current_end.strftime('%Y-%m-%d'),
+                'total_amount': float(total)
+            })
+            current_start += timedelta(days=7)
+    else:
+        raise ValueError('Параметр group_by должен быть "day" или "week"')
+
+    return {'group_by': group_by, 'data': result_data}
+
+
+COHORT_SQL = """
+WITH visits AS (
+    SELECT DISTINCT client_id,
+           date_trunc('month', date_time AT TIME ZONE %s)::date AS month
+    FROM leads_lead
+    WHERE is_confirmed AND client_id IS NOT NULL AND date_time IS NOT NULL AND date_time < %s
+),
+cohorts AS (
+    SELECT month, MIN(month) OVER (PARTITION BY client_id) AS cohort
+    FROM visits
+),
+counts AS (
+    SELECT cohort,
+           ((EXTRACT(YEAR FROM month) - EXTRACT(YEAR FROM cohort)) * 12
+             + EXTRACT(MONTH FROM month) - EXTRACT(MONTH FROM cohort))::int AS month_offset,
+           COUNT(*) AS clients
+    FROM cohorts
+    WHERE cohort >= %s
+    GROUP BY cohort, month_offset
+)
+SELECT cohort, month_offset, clients,
+       SUM(clients) FILTER (WHERE month_offset = 0) OVER (PARTITION BY cohort) AS cohort_size
+FROM counts
+ORDER BY cohort, month_offset
+"""
+
+
+def last_closed_month():
+    return timezone.localdate().replace(day=1) - relativedelta(months=1)
+
+
+def cohort_report(start_date, end_date):
+    """
+    Когорты клиентов по месяцу первого подтвержденного визита и доля вернувшихся
+    в каждом следующем месяце. Считается только по закрытым месяцам, поэтому
+    результат для пары (start, end) неизменен и кешируется надолго.
+    """
+    start_month = start_date.replace(day=1)
+    end_month = min(end_date.replace(day=1), last_closed_month())
+    if start_month > end_month:
+        return {'data': [], 'cohorts': []}
+
+    def build():
+        end_dt = timezone.make_aware(datetime.combine(end_month + relativedelta(months=1), time.min))
+        rows = fetch_dicts(COHORT_SQL, [settings.TIME_ZONE, end_dt, start_month])
+
+        data = []
+        cohorts = {}
+        for row in rows:
+            cohort = row['cohort'].strftime('%Y-%m')
+            size = int(row['cohort_size'] or 0)
+            rate = round(row['clients'] / size * 100, 2) if size else 0
+            data.append({
+                'cohort': cohort,
+                'month_offset': row['month_offset'],
+                'clients': row['clients'],
+                'cohort_size': size,
+                'retention_percent': rate
+            })
+            cohorts.setdefault(cohort, {'cohort': cohort, 'month': row['cohort'], 'size': size, 'offsets': {}})
+            cohorts[cohort]['offsets'][row['month_offset']] = rate
+
+        matrix = []
+        for cohort in cohorts.values():
+            months = (end_month.year - cohort['month'].year) * 12 + end_month.month - cohort['month'].month + 1
+            matrix.append({
+                'cohort': cohort['cohort'],
+                'size': cohort['size'],
+                'retention_percent': [cohort['offsets'].get(i, 0) for i in range(months)]
+            })
+        return {'data': data, 'cohorts': matrix}
+
+    key = f'cohorts:{start_month:%Y-%m}:{end_month:%Y-%m}'
+    return cached_report(key, build, CLOSED_MONTH_CACHE_TIMEOUT)
+
+
+UTILIZATION_SQL = """
+WITH days AS (
+    SELECT d::date AS day
+    FROM generate_series(%s::date, %s::date, interval '1 day') AS d
+),
+scheduled AS (
+    SELECT s.employee_id AS master_id, days.day,
+           SUM(EXTRACT(EPOCH FROM (s.end_time - s.start_time)) / 60)::integer AS scheduled_minutes
+    FROM days
+    JOIN users_employeeschedule s ON s.weekday = EXTRACT(ISODOW FROM days.day)
+    GROUP BY 1, 2
+),
+booked AS (
+    SELECT l.master_id, (l.date_time AT TIME ZONE %s)::date AS day,
+           SUM(sv.duration)::integer AS booked_minutes
+    FROM leads_lead l
+    JOIN leads_lead_services ls ON ls.lead_id = l.id
+    JOIN leads_service sv ON sv.id = ls.service_id
+    WHERE l.date_time >= %s AND l.date_time < %s AND l.is_confirmed IS NOT FALSE
+    GROUP BY 1, 2
+)
+SELECT sc.master_id, u.first_name, u.last_name, sc.day, sc.scheduled_minutes,
+       COALESCE(b.booked_minutes, 0) AS booked_minutes,
+       ROUND(COALESCE(b.booked_minutes, 0) * 100.0 / NULLIF(sc.scheduled_minutes, 0), 2) AS utilization_percent
+FROM scheduled sc
+JOIN users_user u ON u.uuid = sc.master_id
+LEFT JOIN booked b ON b.master_id = sc.master_id AND b.day = sc.day
+WHERE u.is_employee AND u.is_active AND (%s::uuid[] IS NULL OR sc.master_id = ANY(%s::uuid[]))
+ORDER BY sc.day, u.first_name, u.last_name
+"""
+
+
+def utilization_report(start_date, end_date, master_ids=None):
+    """
+    Загрузка мастеров: минуты по графику (EmployeeSchedule по дням недели),
+    занятые минуты по записям (кроме отклоненных) и их отношение по каждому дню.
+    Записи в дни без графика не учитываются.
+    """
+    start_dt, end_dt = datetime_range(start_date, end_date)
+    master_ids = [str(m) for m in master_ids] if master_ids else None
+    rows = fetch_dicts(UTILIZATION_SQL, [
+        start_date, end_date, settings.TIME_ZONE, start_dt, end_dt, master_ids, master_ids
+    ])
+
+    data = []
+    masters = {}
+    for row in rows:
+        master_id = str(row['master_id'])
+        data.append({
+            'master_id': master_id,
+            'master_name': f"{row['first_name']} {row['last_name']}".strip(),
+            'date': row['day'].strftime('%Y-%m-%d'),
+            'scheduled_minutes': row['scheduled_minutes'],
+            'booked_minutes': row['booked_minutes'],
+            'utilization_percent': float(row['utilization_percent'] or 0)
+        })
+        total = masters.setdefault(master_id, {
+            'master_id': master_id,
+            'master_name': data[-1]['master_name'],
+            'scheduled_minutes': 0,
+            'booked_minutes': 0
+        })
+        total['scheduled_minutes'] += row['scheduled_minutes']
+        total['booked_minutes'] += row['booked_minutes']
+
+    for total in masters.values():
+        scheduled = total['scheduled_minutes']
+        total['utilization_percent'] = round(total['booked_minutes'] * 100 / scheduled, 2) if scheduled else 0
+
+    return {'masters': list(masters.values()), 'data': data}
+
+
+def booking_heatmap(start_date, end_date, master_ids=None, service_ids=None, weight='count'):
+    """
+    Плотность записей по дням недели (1-7) и часам (0-23) в локальном времени.
+    weight='minutes' взвешивает ячейки длительностью услуг.
+    """
+    if weight not in ('count', 'minutes'):
+        raise ValueError('Параметр weight должен быть "count" или "minutes"')
+
+    master_ids = sorted(str(m) for m in master_ids or [])
+    service_ids = sorted(int(s) for s in service_ids or [])
+
+    def build():
+        start_dt, end_dt = datetime_range(start_date, end_date)
+        queryset = Lead.objects.filter(date_time__gte=start_dt, date_time__lt=end_dt).exclude(is_confirmed=False)
+        if master_ids:
+            queryset = queryset.filter(master_id__in=master_ids)
+        if service_ids:
+            queryset = queryset.filter(services__id__in=service_ids)
+
+        rows = (
+            queryset
+            .annotate(weekday=ExtractIsoWeekDay('date_time'), hour=ExtractHour('date_time'))
+            .order_by()
+            .values('weekday', 'hour')
+            .annotate(leads=Count('id', distinct=True), minutes=Sum('services__duration'))
+        )
+
+        matrix = [[0] * 24 for _ in range(7)]
+        data = []
+        for row in rows:
+            value = row['leads'] if weight == 'count' else (row['minutes'] or 0)
+            matrix[row['weekday'] - 1][row['hour']] = value
+            data.append({
+                'weekday': row['weekday'],
+                'hour': row['hour'],
+                'leads': row['leads'],
+                'minutes': row['minutes'] or 0
+            })
+        data.sort(key=lambda r: (r['weekday'], r['hour']))
+        return {
+            'weight': weight,
+            'max': max(max(day) for day in matrix),
+            'matrix': matrix,
+            'data': data
+        }
+
+    key = ':'.join([
+        'heatmap', start_date.isoformat(), end_date.isoformat(), weight,
+        ','.join(master_ids), ','.join(map(str, service_ids))
+    ])
+    return cached_report(key, build)
+
+
+SERVICE_BASKET_SQL = """
+WITH baskets AS (
+    SELECT ls.lead_id, ls.service_id
+    FROM leads_lead_services ls
+    JOIN leads_lead l ON l.id = ls.lead_id
+    WHERE l.is_confirmed
+      AND (%s::timestamptz IS NULL OR l.date_time >= %s::timestamptz)
+      AND (%s::timestamptz IS NULL OR l.date_time < %s::timestamptz)
+),
+service_counts AS (
+    SELECT service_id, COUNT(*) AS leads FROM baskets GROUP BY service_id
+),
+total AS (
+    SELECT COUNT(DISTINCT lead_id) AS leads FROM baskets
+),
+pairs AS (
+    SELECT a.service_id AS service_a, b.service_id AS service_b, COUNT(*) AS pair_count
+    FROM baskets a
+    JOIN baskets b ON b.lead_id = a.lead_id AND a.service_id < b.service_id
+    GROUP BY a.service_id, b.service_id
+    HAVING COUNT(*) >= %s
+)
+SELECT p.service_a, sa.name AS service_a_name, p.service_b, sb.name AS service_b_name,
+       p.pair_count, ca.leads AS service_a_count, cb.leads AS service_b_count, t.leads AS total_leads,
+       ROUND(p.pair_count::numeric / t.leads, 4) AS support,
+       ROUND(p.pair_count::numeric / ca.leads, 4) AS confidence_a_to_b,
+       ROUND(p.pair_count::numeric / cb.leads, 4) AS confidence_b_to_a,
+       ROUND(p.pair_count::numeric * t.leads / (ca.leads * cb.leads), 4) AS lift
+FROM pairs p
+JOIN service_counts ca ON ca.service_id = p.service_a
+JOIN service_counts cb ON cb.service_id = p.service_b
+JOIN leads_service sa ON sa.id = p.service_a
+JOIN leads_service sb ON sb.id = p.service_b
+CROSS JOIN total t
+ORDER BY p.pair_count DESC, lift DESC
+"""
+
+SERVICE_BASKET_CACHE_TIMEOUT = 60 * 60 * 26
+SERVICE_BASKET_MIN_COUNT = 2
+
+
+def service_basket_report(start_date=None, end_date=None, min_count=SERVICE_BASKET_MIN_COUNT, refresh=False):
+    """
+    Пары услуг, которые покупают вместе в одной подтвержденной записи: количество,
+    support, confidence и lift. Без периода считается по всей истории — этот вариант
+    заранее пересчитывается задачей precompute_service_baskets.
+
+    Запрос выполняется и кешируется один раз на период с порогом SERVICE_BASKET_MIN_COUNT,
+    больший min_count отбирается из кеша (метрики пары от порога не зависят), меньший — не допускается.
+    """
+    min_count = max(int(min_count), SERVICE_BASKET_MIN_COUNT)
+    if start_date and end_date:
+        start_dt, end_dt = datetime_range(start_date, end_date)
+        key = f'baskets:{start_date.isoformat()}:{end_date.isoformat()}'
+        timeout = REPORT_CACHE_TIMEOUT
+    else:
+        start_dt = end_dt = None
+        key = 'baskets:all'
+        timeout = SERVICE_BASKET_CACHE_TIMEOUT
+
+    def build():
+        rows = fetch_dicts(SERVICE_BASKET_SQL, [start_dt, start_dt, end_dt, end_dt, SERVICE_BASKET_MIN_COUNT])
+        for row in rows:
+            for field in ('support', 'confidence_a_to_b', 'confidence_b_to_a', 'lift'):
+                row[field] = float(row[field])
+        return rows
+
+    rows = cached_report(key, build, timeout, refresh=refresh)
+    return {'min_count': min_count, 'data': [row for row in rows if row['pair_count'] >= min_count]}
+
+
+def _build_financial(start_date, end_date, params):
+    return financial_report(start_date, end_date, params.get('group_by', 'day'))
+
+
+def _build_cohorts(start_date, end_date, params):
+    return cohort_report(start_date, end_date)
+
+
+def _build_utilization(start_date, end_date, params):
+    return utilization_report(start_date, end_date, params.get('master_ids'))
+
+
+def _build_heatmap(start_date, end_date, params):
+    return booking_heatmap(
+        start_date, end_date, params.get('master_ids'), params.get('service_ids'), params.get('weight', 'count')
+    )
+
+
+def _build_baskets(start_date, end_date, params):
+    return service_basket_report(start_date, end_date, params.get('min_count', SERVICE_BASKET_MIN_COUNT))
+
+
+REPORT_BUILDERS = {
+    'financial': _build_financial,
+    'cohorts': _build_cohorts,
+    'utilization': _build_utilization,
+    'heatmap': _build_heatmap,
+    'baskets': _build_baskets,
+}
+
+
+def build_report(report_type, params):
+    """Строит отчет без ограничения периода. Используется фоновыми задачами."""
+    try:
+        builder = REPORT_BUILDERS[report_type]
+    except KeyError:
+        raise ValueError(f'Неизвестный тип отчета: {report_type}')
+
+    start_date, end_date, period_type = resolve_period(params)
+    payload = builder(start_date, end_date, params)
+    return {
+        'period': {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
+            'type': period_type
+        },
+        **payload
+    }
+
+
+def report_to_csv(payload):
+    rows = payload.get('data') or []
+    buffer = io.StringIO()
+    if rows:
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    return buffer.getvalue()
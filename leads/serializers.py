@@ -1,14 +1,17 @@
-import asyncio, json
+import json
 from datetime import timedelta
 from rest_framework import serializers
 from django.utils import timezone
-from django.db.models import Sum, F
+from django.db import transaction
+from django.db.models import Prefetch
 from django.http import QueryDict
 
 from leads.tasks import check_payment_status
 from users.models import EmployeeSchedule
-from users.utils import send_order_message
-from .models import Service, Lead, Client
+from users.tasks import queue_telegram_message
+from .models import Service, Lead, Client, ReportJob
+from .reports import REPORT_BUILDERS, resolve_period
+from core.serializers import DynamicFieldsMixin
 from users.serializers import UserGet
 
 
@@ -18,7 +21,7 @@ class ServiceBaseSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     additional_services = ServiceBaseSerializer(many=True, read_only=True)
     parent_services = serializers.PrimaryKeyRelatedField(
         queryset=Service.objects.all(), many=True, required=False
@@ -27,6 +30,16 @@ class ServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Service
         fields = '__all__'
+        expandable_fields = {
+            'additional_services': {
+                'prefetch': [Prefetch('additional_services', queryset=Service.objects.prefetch_related('parent_services'))],
+                'collapsed': ['additional_services'],
+            },
+            'parent_services': {
+                'prefetch': [Prefetch('parent_services', queryset=Service.objects.prefetch_related('parent_services'))],
+                'collapsed': ['parent_services'],
+            },
+        }
 
     def to_internal_value(self, data):
         if isinstance(data, QueryDict):
@@ -63,9 +76,10 @@ class ServiceSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['parent_services'] = ServiceBaseSerializer(
-            instance.parent_services.all(), many=True
-        ).data
+        if self.is_expanded('parent_services'):
+            representation['parent_services'] = ServiceBaseSerializer(
+                instance.parent_services.all(), many=True
+            ).data
         return representation
 
     def validate(self, attrs):
@@ -92,33 +106,51 @@ class ServiceSerializer(serializers.ModelSerializer):
         return attrs
 
 class ClientSerializer(serializers.ModelSerializer):
+    visits_count = serializers.IntegerField(read_only=True)
+    last_visit = serializers.DateTimeField(read_only=True)
+
     class Meta:
         model = Client
         fields = '__all__'
 
     def to_representation(self, instance):
+        # Статистика берется из аннотаций Client.objects.with_stats();
+        # для одиночного объекта без них (create/update) — один дополнительный запрос.
+        if not hasattr(instance, 'visits_count'):
+            instance = Client.objects.with_stats().get(pk=instance.pk)
         representation = super().to_representation(instance)
-        representation['visits_count'] = Lead.objects.filter(client=instance).count()
-        representation['total_sum'] = Lead.objects.aggregate(total=Sum(F('services__price')))['total'] or 0
- 
+        representation['total_sum'] = instance.total_sum
+
         return representation
 
 
-class LeadSerializer(serializers.ModelSerializer):
+class LeadSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     services = serializers.PrimaryKeyRelatedField(queryset=Service.objects.all(), many=True)
 
     class Meta:
         model = Lead
         fields = '__all__'
+        expandable_fields = {
+            'services': {
+                'prefetch': [Prefetch('services', queryset=Service.objects.with_relations())],
+                'collapsed': ['services'],
+            },
+            'master': {'select': ['master']},
+            'client': {'prefetch': [Prefetch('client', queryset=Client.objects.with_stats())]},
+        }
 
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['services'] = ServiceSerializer(instance.services.all(), many=True).data
-        representation['master'] = UserGet(instance.master).data
-        representation['client'] = ClientSerializer(instance.client).data if instance.client else None
-        date_field = instance.date if instance.date else instance.date_time
-        representation['weekday'] = date_field.isoweekday()
+        if self.is_expanded('services'):
+            representation['services'] = ServiceSerializer(instance.services.all(), many=True).data
+        if self.is_expanded('master'):
+            representation['master'] = UserGet(instance.master).data
+        if self.is_expanded('client'):
+            representation['client'] = ClientSerializer(instance.client).data if instance.client else None
+        if self.wants('weekday'):
+            date_field = instance.date if instance.date else instance.date_time
+            representation['weekday'] = date_field.isoweekday()
         return representation
     
     def validate(self, data):
@@ -215,9 +247,10 @@ class LeadSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         services = validated_data.pop('services', [])
-        lead = Lead.objects.create(**validated_data)
-        if services:
-            lead.services.set(services)
+        with transaction.atomic():
+            lead = Lead.objects.create(**validated_data)
+            if services:
+                lead.services.set(services)
 
         client_name = lead.client.name if lead.client else lead.client_name or "Без имени"
         phone = lead.phone or "—"
@@ -245,9 +278,9 @@ class LeadSerializer(serializers.ModelSerializer):
             f"⏰ Напоминание: *{reminder_text}*\n"
         )
 
-        asyncio.run(send_order_message(message))
+        queue_telegram_message(message)
         if lead.master.telegram_chat_id:
-            asyncio.run(send_order_message(message, [lead.master.telegram_chat_id]))
+            queue_telegram_message(message, [lead.master.telegram_chat_id])
 
         try:
             pass
@@ -260,6 +293,37 @@ class LeadSerializer(serializers.ModelSerializer):
         return lead
 
 
+class LeadCompactSerializer(serializers.Serializer):
+    """Облегченная запись для календарей, строится из Lead.objects.compact()."""
+    id = serializers.IntegerField()
+    date_time = serializers.DateTimeField(allow_null=True)
+    date = serializers.DateField(allow_null=True)
+    duration = serializers.IntegerField()
+    client_name = serializers.CharField(source='client_display_name', allow_null=True)
+    phone = serializers.CharField(source='client_phone', allow_null=True)
+    master_id = serializers.UUIDField()
+    services = serializers.ListField(source='service_names', child=serializers.CharField())
+    is_confirmed = serializers.BooleanField(allow_null=True)
+
+
 class BusySlotSerializer(serializers.Serializer):
     date_time = serializers.DateTimeField()
     master_id = serializers.UUIDField()
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    report_type = serializers.ChoiceField(choices=list(REPORT_BUILDERS))
+
+    class Meta:
+        model = ReportJob
+        fields = ('uuid', 'report_type', 'params', 'status', 'error', 'created_at', 'finished_at')
+        read_only_fields = ('status', 'error', 'created_at', 'finished_at')
+
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Параметры должны быть объектом")
+        try:
+            resolve_period(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return value
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .busy import invalidate_busy_slots
+from .catalog import invalidate_catalog
+from .events import schedule_lead_events, schedule_lead_removed
+from .models import Lead, Service
+
+
+def schedule_catalog_invalidation():
+    # Новое поколение — только после коммита: иначе каталог, собранный до коммита из старых данных,
+    # закешировался бы уже под новым поколением. Каталог соберет первый запрос (ссылки зависят от хоста).
+    transaction.on_commit(invalidate_catalog, robust=True)
+
+
+@receiver([post_save, post_delete], sender=Service)
+def service_changed(sender, **kwargs):
+    schedule_catalog_invalidation()
+
+
+@receiver(m2m_changed, sender=Service.parent_services.through)
+def service_relations_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        schedule_catalog_invalidation()
+
+
+@receiver(pre_save, sender=Lead)
+def lead_moving(sender, instance, **kwargs):
+    # Запись могли перенести на другой день или к другому мастеру — сбрасываем и прежний день.
+    if instance.pk:
+        previous = Lead.objects.filter(pk=instance.pk).values_list('date_time', 'master_id').first()
+        instance._previous_date_time, instance._previous_master_id = previous or (None, None)
+
+
+@receiver(post_save, sender=Lead)
+def lead_saved(sender, instance, created, **kwargs):
+    lead_changed(instance)
+    schedule_lead_events([instance.pk], 'created' if created else 'updated')
+    previous_master_id = getattr(instance, '_previous_master_id', None)
+    if previous_master_id and previous_master_id != instance.master_id:
+        schedule_lead_removed(instance.pk, previous_master_id, only_master=True)
+
+
+@receiver(post_delete, sender=Lead)
+def lead_deleted(sender, instance, **kwargs):
+    lead_changed(instance)
+    schedule_lead_removed(instance.pk, instance.master_id)
+
+
+def lead_changed(instance):
+    dates = (instance.date_time, getattr(instance, '_previous_date_time', None))
+    invalidate_busy_slots(*dates)
+    # и после коммита: параллельный запрос мог успеть закешировать день со старыми данными
+    transaction.on_commit(lambda: invalidate_busy_slots(*dates), robust=True)
+
+
+@receiver(m2m_changed, sender=Lead.services.through)
+def lead_services_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Lead):
+        invalidate_busy_slots(instance.date_time)
+        transaction.on_commit(lambda: invalidate_busy_slots(instance.date_time), robust=True)
+        schedule_lead_events([instance.pk], 'updated')
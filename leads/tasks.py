@@ -1,10 +1,18 @@
 import os
+from datetime import timedelta
 import hashlib
 import requests
 import xml.etree.ElementTree as ET
 from celery import shared_task
 from django.conf import settings
-from .models import Lead
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from core.routers import use_replica
+from users.tasks import queue_telegram_message
+from .changes import purge_tombstones
+from .models import Lead, ReportJob
+from .reports import build_report, report_to_csv, service_basket_report
 
 INIT_URL      = 'https://api.freedompay.kg/init_payment.php'
 STATUS_URL    = 'https://api.freedompay.kg/get_status3.php'
@@ -13,6 +21,11 @@ SCRIPT_STATUS = 'get_status3.php'
 MERCHANT_ID   = settings.FREEDOMPAY_MERCHANT_ID
 SECRET_KEY    = settings.FREEDOMPAY_SECRET_KEY
 
+REPORT_MATERIALIZED_VIEWS = ('leads_revenue_daily', 'leads_status_daily')
+LEAD_TOMBSTONE_RETENTION = timedelta(days=30)
+REMINDER_BATCH_SIZE = 200
+REMINDER_MAX_BATCHES = 50
+
 def _make_signature(script_name: str, params: dict) -> str:
     items = {k: v for k, v in params.items() if k != 'pg_sig'}
     sorted_keys = sorted(items.keys())
@@ -59,3 +72,139 @@ def check_payment_status(self, lead_pk: int):
         pass
     else:
         self.retry(countdown=15)
+
+
+@shared_task
+def build_report_job(job_pk: str):
+    """
+    Task: считает отчет для ReportJob в воркере и сохраняет результат (JSON + CSV).
+    """
+    try:
+        job = ReportJob.objects.get(pk=job_pk)
+    except ReportJob.DoesNotExist:
+        return
+
+    job.status = 'running'
+    job.save(update_fields=['status'])
+
+    try:
+        with use_replica():
+            payload = build_report(job.report_type, job.params)
+    except Exception as exc:
+        job.status = 'failed'
+        job.error = str(exc)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        raise
+
+    job.result = payload
+    job.csv_file.save(
+        f'{job.report_type}-{job.pk}.csv',
+        ContentFile(report_to_csv(payload).encode('utf-8')),
+        save=False
+    )
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'csv_file', 'status', 'finished_at'])
+
+
+@shared_task
+def refresh_report_views():
+    """
+    Task (celery beat): обновляет материализованные представления отчетов.
+    CONCURRENTLY не блокирует чтение отчетов на время обновления.
+    """
+    with connection.cursor() as cursor:
+        for view in REPORT_MATERIALIZED_VIEWS:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {view}')
+
+
+COMPACT_COUNTERS_SQL = """
+WITH moved AS (
+    DELETE FROM leads_counterdelta RETURNING key, delta
+)
+INSERT INTO leads_counter (key, value)
+SELECT key, SUM(delta) FROM moved GROUP BY key
+ON CONFLICT (key) DO UPDATE SET value = leads_counter.value + EXCLUDED.value
+"""
+
+
+@shared_task
+def compact_counters():
+    """
+    Task (celery beat, раз в минуту): сворачивает CounterDelta в Counter одним запросом.
+    Строки счетчиков блокирует только эта задача, а не транзакции, создающие записи.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(COMPACT_COUNTERS_SQL)
+
+
+@shared_task
+def precompute_service_baskets():
+    """
+    Task (celery beat): пересчитывает анализ пар услуг по всей истории и кладет в кеш,
+    чтобы отчет без периода не считался в веб-запросе.
+    """
+    with use_replica():
+        service_basket_report(refresh=True)
+
+
+@shared_task
+def purge_lead_tombstones():
+    """
+    Task (celery beat): удаляет надгробия удаленных записей старше LEAD_TOMBSTONE_RETENTION.
+    Клиенты с более старым токеном /leads/changes/ получат 410 и загрузят расписание заново.
+    """
+    purge_tombstones(timezone.now() - LEAD_TOMBSTONE_RETENTION)
+
+
+def reminder_message(lead):
+    client_name = lead.client.name if lead.client else lead.client_name or "Без имени"
+    service_names = ", ".join(s.name for s in lead.services.all())
+    master_name = lead.master.first_name or lead.master.email
+    date_str = timezone.localtime(lead.date_time).strftime("%d.%m.%Y %H:%M")
+    return (
+        f"⏰ *Напоминание о записи*\n"
+        f"👤 Клиент: *{client_name}*\n"
+        f"📞 Телефон: `{lead.phone or (lead.client.phone if lead.client else '—')}`\n"
+        f"🛠 Услуги: *{service_names}*\n"
+        f"🧑‍🔧 Мастер: *{master_name}*\n"
+        f"🕒 Дата и время: *{date_str}*\n"
+    )
+
+
+@shared_task
+def send_due_reminders():
+    """
+    Task (celery beat, раз в минуту): рассылает напоминания, у которых наступил remind_at.
+    Записи забираются пачками через SELECT ... FOR UPDATE SKIP LOCKED по частичному индексу,
+    поэтому параллельные запуски не отправят одно напоминание дважды.
+    Прошедшие и отклоненные записи только помечаются, без отправки.
+    """
+    now = timezone.now()
+    for _ in range(REMINDER_MAX_BATCHES):
+        with transaction.atomic():
+            batch = list(
+                Lead.objects.filter(reminder_sent_at__isnull=True, remind_at__lte=now)
+                .order_by('remind_at')
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:REMINDER_BATCH_SIZE]
+            )
+            if not batch:
+                return
+            Lead.objects.filter(id__in=batch).update(reminder_sent_at=now)
+
+            leads = (
+                Lead.objects.filter(id__in=batch, date_time__gt=now)
+                .exclude(is_confirmed=False)
+                .select_related('client', 'master')
+                .prefetch_related('services')
+            )
+            for lead in leads:
+                # отправка уходит в очередь после коммита пачки
+                message = reminder_message(lead)
+                queue_telegram_message(message)
+                if lead.master.telegram_chat_id:
+                    queue_telegram_message(message, [lead.master.telegram_chat_id])
+        if len(batch) < REMINDER_BATCH_SIZE:
+            return
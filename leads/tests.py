@@ -1,3 +1,661 @@
-from django.test import TestCase
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import orjson
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.routers import REPLICA_DB, ReplicaRouter, use_replica
+from rest_framework.test import APIClient
+
+from .catalog import build_catalog, catalog_generation
+from .dashboard import DASHBOARD_WIDGET_ERROR, DASHBOARD_WIDGETS
+from .changes import change_seq_ceiling, current_change_token, purge_tombstones
+from .events import backlog_events, lead_event_stream, lead_events_channel, publish
+from .models import Client, Counter, CounterDelta, Lead, LeadTombstone, ReportJob, Service
+from .reports import master_summary, service_basket_report
+from .serializers import LeadSerializer
+from .tasks import compact_counters, send_due_reminders
+
+User = get_user_model()
+
+
+class LeadSerializerQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.masters = [User.objects.create_user(email=f'master{i}@example.com') for i in range(3)]
+        cls.base = Service.objects.create(name='Маникюр', duration=60)
+        cls.extra = Service.objects.create(name='Дизайн', duration=15, is_additional=True)
+        cls.extra.parent_services.add(cls.base)
+        cls.other = Service.objects.create(name='Педикюр', duration=90)
+
+    def create_leads(self, count):
+        start = timezone.now() + timedelta(days=1)
+        for i in range(count):
+            client = Client.objects.create(phone=f'+996555{Client.objects.count():06d}', name=f'Клиент {i}')
+            lead = Lead.objects.create(
+                client=client, master=self.masters[i % len(self.masters)], date_time=start + timedelta(hours=i),
+                is_confirmed=True
+            )
+            lead.services.set([self.base, self.extra] if i % 2 else [self.other])
+
+    def list_queries(self, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = APIClient().get('/leads/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context.captured_queries)
+
+    def test_serializer_uses_prefetched_relations(self):
+        self.create_leads(5)
+        # leads + client + services + additional_services и parent_services с их parent_services
+        with self.assertNumQueries(7):
+            data = LeadSerializer(Lead.objects.with_relations(), many=True).data
+        self.assertEqual(len(data), 5)
+        self.assertTrue(all(item['client']['visits_count'] == 1 for item in data))
+
+    def test_compact_keeps_default_ordering(self):
+        self.assertTrue(Lead.objects.compact().ordered)
+        self.assertEqual(Lead.objects.compact().query.order_by, tuple(Lead._meta.ordering))
+        self.assertEqual(Lead.objects.order_by('date_time').compact().query.order_by, ('date_time',))
+
+    @skipUnless(connection.vendor == 'postgresql', 'compact() использует ArrayAgg')
+    def test_compact_matches_full_view_order(self):
+        self.create_leads(6)
+        client = APIClient()
+        client.force_authenticate(self.masters[0])
+        full = client.get('/my-leads/').data
+        compact = client.get('/my-leads/', {'view': 'compact'}).data
+        self.assertEqual([item['id'] for item in compact], [item['id'] for item in full])
+
+    @skipUnless(connection.vendor == 'postgresql', 'compact() использует ArrayAgg')
+    def test_lead_list_supports_compact_view(self):
+        self.create_leads(4)
+        full = APIClient().get('/leads/', {'limit': 3}).data
+        compact = APIClient().get('/leads/', {'limit': 3, 'view': 'compact'}).data
+        self.assertEqual([item['id'] for item in compact['results']], [item['id'] for item in full['results']])
+        self.assertIsInstance(compact['results'][0]['services'][0], str)
+        self.assertNotIn('client', compact['results'][0])
+
+        rest = APIClient().get(compact['next']).data
+        self.assertEqual(len(rest['results']), 1)
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        self.create_leads(3)
+        small = self.list_queries(3)
+        self.create_leads(12)
+        large = self.list_queries(15)
+        self.assertEqual(small, large)
+
+    def client_list_queries(self, limit):
+        client = APIClient()
+        client.force_authenticate(self.masters[0])
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/clients/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context.captured_queries)
+
+    def test_client_list_query_count_does_not_depend_on_page_size(self):
+        self.create_leads(3)
+        small = self.client_list_queries(3)
+        self.create_leads(12)
+        large = self.client_list_queries(15)
+        self.assertEqual(small, large)
+
+    def test_client_stats_count_confirmed_visits_without_fan_out(self):
+        client = Client.objects.create(phone='+996700000001', name='Постоянный клиент')
+        start = timezone.now() + timedelta(days=1)
+        confirmed = Lead.objects.create(client=client, master=self.masters[0], date_time=start, is_confirmed=True)
+        confirmed.services.set([
+            Service.objects.create(name='Наращивание', price=1200),
+            Service.objects.create(name='Снятие', price=300),
+        ])
+        pending = Lead.objects.create(client=client, master=self.masters[0], date_time=start + timedelta(hours=2))
+        pending.services.set([Service.objects.create(name='Покрытие', price=800)])
+
+        stats = Client.objects.with_stats().get(pk=client.pk)
+        self.assertEqual(stats.visits_count, 1)
+        self.assertEqual(stats.total_sum, 1500)
+        self.assertEqual(stats.last_visit, confirmed.date_time)
+
+
+class ServiceCatalogTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = Service.objects.create(name='Маникюр', image='services/manicure.jpg')
+
+    def get_catalog(self):
+        response = APIClient().get('/services/catalog/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_catalog_changes_after_commit_and_has_absolute_image_urls(self):
+        first = self.get_catalog()
+        self.assertIn(b'"http://testserver/media/services/manicure.jpg"', first.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Маникюр классический'
+            self.service.save()
+        second = self.get_catalog()
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertIn('Маникюр классический'.encode(), second.content)
+
+    def test_build_started_before_change_does_not_overwrite_catalog(self):
+        request = RequestFactory().get('/services/catalog/')
+        stale_generation = catalog_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Маникюр классический'
+            self.service.save()
+        # сборка из старых данных заканчивается уже после коммита
+        Service.objects.filter(pk=self.service.pk).update(name='Маникюр')
+        build_catalog(request, stale_generation)
+        Service.objects.filter(pk=self.service.pk).update(name='Маникюр классический')
+
+        self.assertIn('Маникюр классический'.encode(), self.get_catalog().content)
+
+
+class BusySlotsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.master = User.objects.create_user(email='busy@example.com')
+        cls.service = Service.objects.create(name='Маникюр', duration=60)
+        cls.client_obj = Client.objects.create(phone='+996555000001', name='Клиент')
+
+    def setUp(self):
+        cache.clear()
+        self.start = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.day = self.start.date().isoformat()
+
+    def get(self, **params):
+        return APIClient().get('/leads/busy_slots/', {'start_date': self.day, 'end_date': self.day, **params})
+
+    def test_requires_period(self):
+        self.assertEqual(APIClient().get('/leads/busy_slots/').status_code, 400)
+
+    def test_intervals_include_buffers_and_cache_is_reset_on_change(self):
+        lead = Lead.objects.create(client=self.client_obj, master=self.master, date_time=self.start)
+        lead.services.set([self.service])
+
+        intervals = self.get().data['masters'][str(self.master.pk)]
+        self.assertEqual(intervals, [[self.start - timedelta(minutes=30), self.start + timedelta(minutes=70)]])
+        with self.assertNumQueries(0):
+            self.get()
+
+        lead.date_time = self.start + timedelta(days=1)
+        lead.save()
+        self.assertEqual(self.get().data['masters'], {})
+
+
+class ReminderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.master = User.objects.create_user(email='reminder@example.com', telegram_chat_id=42)
+        cls.client_obj = Client.objects.create(phone='+996555000002', name='Клиент')
+
+    def create_lead(self, starts_in, reminder_minutes=60, **kwargs):
+        return Lead.objects.create(
+            client=self.client_obj, master=self.master, date_time=timezone.now() + starts_in,
+            reminder_minutes=reminder_minutes, **kwargs
+        )
+
+    def test_remind_at_follows_date_time(self):
+        lead = self.create_lead(timedelta(hours=3))
+        self.assertEqual(lead.remind_at, lead.date_time - timedelta(minutes=60))
+        lead.reminder_sent_at = timezone.now()
+        lead.save()
+        self.assertIsNotNone(lead.reminder_sent_at)
+
+        lead.date_time += timedelta(days=1)
+        lead.save()
+        self.assertEqual(lead.remind_at, lead.date_time - timedelta(minutes=60))
+        self.assertIsNone(lead.reminder_sent_at)
+
+    def test_due_reminders_are_sent_once(self):
+        due = self.create_lead(timedelta(minutes=30))
+        rejected = self.create_lead(timedelta(minutes=30), is_confirmed=False)
+        later = self.create_lead(timedelta(hours=3))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            send_due_reminders()
+        # операторам и мастеру
+        self.assertEqual(len(callbacks), 2)
+        sent = set(Lead.objects.filter(reminder_sent_at__isnull=False).values_list('id', flat=True))
+        self.assertEqual(sent, {due.id, rejected.id})
+        self.assertNotIn(later.id, sent)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            send_due_reminders()
+        self.assertEqual(callbacks, [])
+
+
+class ReportEndpointsTest(TestCase):
+    def test_user_sees_only_own_jobs(self):
+        owner = User.objects.create_user(email='owner@example.com')
+        other = User.objects.create_user(email='other@example.com')
+        job = ReportJob.objects.create(report_type='financial', created_by=owner, status='done')
+
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get('/reports/jobs/').data['results'], [])
+        self.assertEqual(client.get(f'/reports/jobs/{job.pk}/').status_code, 404)
+        self.assertEqual(client.get(f'/reports/jobs/{job.pk}/download/').status_code, 404)
+
+        client.force_authenticate(owner)
+        self.assertEqual(client.get(f'/reports/jobs/{job.pk}/').status_code, 200)
+
+    def test_heatmap_export_filters_by_service_ids(self):
+        user = User.objects.create_user(email='heatmap@example.com')
+        services = [Service.objects.create(name=f'Услуга {i}') for i in range(12)]
+        lead = Lead.objects.create(client_name='Клиент', phone='+996555000000', master=user, is_confirmed=True,
+                                   date_time=timezone.make_aware(datetime(2025, 3, 10, 12)))
+        lead.services.set([services[-1]])
+        cache.clear()
+
+        client = APIClient()
+        client.force_authenticate(user)
+
+        def export(service_ids):
+            response = client.get('/export/reports/heatmap/', {
+                'start_date': '2025-03-01', 'end_date': '2025-03-31', 'service_ids': service_ids,
+            })
+            self.assertEqual(response.status_code, 200)
+            return b''.join(response.streaming_content).decode().splitlines()[1:]
+
+        self.assertEqual(len(export(str(services[-1].pk))), 1)
+        self.assertEqual(len(export(f'{services[0].pk},{services[-1].pk}')), 1)
+        self.assertEqual(export(f'{services[0].pk},{services[1].pk}'), [])
+
+        response = client.get('/export/reports/heatmap/', {'type': 'month', 'service_ids': '1,x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Неверные параметры отчета'})
+
+    def test_sync_export_rejects_long_period(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='export@example.com'))
+        response = client.get('/export/reports/financial/', {'start_date': '2025-01-01', 'end_date': '2025-12-31'})
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch('core.routers.replica_configured', return_value=True)
+class ReplicaRoutingTest(TestCase):
+    def test_use_replica_routes_reads_only(self, _):
+        self.assertEqual(Lead.objects.all().db, 'default')
+        with use_replica():
+            self.assertEqual(Lead.objects.all().db, REPLICA_DB)
+            self.assertEqual(ReplicaRouter().db_for_write(Lead), 'default')
+        self.assertEqual(Lead.objects.all().db, 'default')
+
+    def test_report_view_reads_from_replica(self, _):
+        aliases = []
+
+        def get_value(key):
+            aliases.append(Counter.objects.all().db)
+            return 0
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='replica@example.com'))
+        with mock.patch.object(Counter, 'get_value', side_effect=get_value):
+            self.assertEqual(client.get('/reports/clients-total/').status_code, 200)
+        self.assertEqual(aliases, [REPLICA_DB])
+        # после запроса чтения снова идут в основную БД
+        self.assertEqual(Counter.objects.all().db, 'default')
+
+
+class ServiceBasketReportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_thresholds_are_filtered_from_one_cached_run(self):
+        rows = [
+            {'pair_count': count, 'support': 0.1, 'confidence_a_to_b': 0.2, 'confidence_b_to_a': 0.3, 'lift': 1.5}
+            for count in (7, 3, 2)
+        ]
+        with mock.patch('leads.reports.fetch_dicts', return_value=rows) as fetch:
+            self.assertEqual(len(service_basket_report(min_count=1)['data']), 3)
+            self.assertEqual(service_basket_report(min_count=1)['min_count'], 2)
+            self.assertEqual([row['pair_count'] for row in service_basket_report(min_count=3)['data']], [7, 3])
+            self.assertEqual(service_basket_report(min_count=10)['data'], [])
+        self.assertEqual(fetch.call_count, 1)
+
+
+class CounterTest(TestCase):
+    def test_value_includes_uncompacted_deltas(self):
+        # в PostgreSQL строку clients_total уже создала миграция 0005
+        stored = Counter.objects.filter(key='clients_total').values_list('value', flat=True).first() or 0
+        pending = Counter.get_value('clients_total') - stored
+        CounterDelta.objects.bulk_create([CounterDelta(key='clients_total', delta=d) for d in (1, 1, -1)])
+        self.assertEqual(Counter.get_value('clients_total'), stored + pending + 1)
+        Counter.objects.update_or_create(key='clients_total', defaults={'value': 10})
+        with self.assertNumQueries(1):
+            self.assertEqual(Counter.get_value('clients_total'), 10 + pending + 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'счетчики ведутся триггерами PostgreSQL')
+    def test_triggers_append_deltas_and_compaction_folds_them(self):
+        before = Counter.get_value('clients_total')
+        Client.objects.create(phone='+996555000003', name='Клиент')
+        Client.objects.create(phone='+996555000004', name='Клиент')
+        self.assertEqual(CounterDelta.objects.filter(key='clients_total').count(), 2)
+        self.assertEqual(Counter.get_value('clients_total'), before + 2)
+
+        compact_counters()
+        self.assertFalse(CounterDelta.objects.exists())
+        self.assertEqual(Counter.objects.get(key='clients_total').value, before + 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'номера изменений проставляются триггерами PostgreSQL')
+class LeadChangesTest(TransactionTestCase):
+    def setUp(self):
+        redis_patcher = mock.patch('leads.events.get_redis')
+        redis_patcher.start()
+        self.addCleanup(redis_patcher.stop)
+        self.master, self.other_master = [User.objects.create_user(email=f'sync{i}@example.com') for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.master)
+        # токен, полученный до загрузки расписания
+        self.token = self.changes()['token']
+
+    def changes(self, **params):
+        response = self.client.get('/leads/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def create_lead(self, hours):
+        return Lead.objects.create(client_name='Клиент', phone='+996555000000', master=self.master,
+                                   date_time=timezone.now() + timedelta(days=1, hours=hours))
+
+    def seq(self, lead):
+        return Lead.objects.get(pk=lead.pk).change_seq
+
+    def tombstone_seq(self, lead):
+        return LeadTombstone.objects.filter(lead_id=lead.pk).latest('change_seq').change_seq
+
+    def move_and_delete(self):
+        kept, moved, deleted = [self.create_lead(i) for i in range(3)]
+        moved.master = self.other_master
+        moved.save()
+        deleted.delete()
+        return kept, moved, deleted
+
+    def test_salon_changes_include_moved_lead_and_deletions(self):
+        kept, moved, deleted = self.move_and_delete()
+        self.assertGreater(self.seq(kept), int(self.token))
+        self.assertGreater(self.tombstone_seq(deleted), self.seq(moved))
+
+        data = self.changes(since=self.token)
+        self.assertEqual([lead['id'] for lead in data['leads']], [kept.pk, moved.pk])
+        self.assertEqual(data['deleted'], [deleted.pk])
+        self.assertEqual(data['token'], str(self.tombstone_seq(deleted)))
+        self.assertFalse(data['has_more'])
+
+        again = self.changes(since=data['token'])
+        self.assertEqual((again['leads'], again['deleted'], again['token']), ([], [], data['token']))
+
+    def test_master_changes_report_moved_lead_as_deleted(self):
+        kept, moved, deleted = self.move_and_delete()
+        data = self.changes(since=self.token, master_id=str(self.master.pk))
+        self.assertEqual([lead['id'] for lead in data['leads']], [kept.pk])
+        self.assertEqual(data['deleted'], [moved.pk, deleted.pk])
+
+        data = self.changes(since=self.token, master_id=str(self.other_master.pk))
+        self.assertEqual([lead['id'] for lead in data['leads']], [moved.pk])
+        self.assertEqual(data['deleted'], [])
+        self.assertEqual(data['token'], str(self.seq(moved)))
+
+    def test_pagination_by_token(self):
+        self.move_and_delete()
+        full = self.changes(since=self.token)
+        token, leads, deleted = self.token, [], []
+        while True:
+            page = self.changes(since=token, limit=1)
+            leads += [lead['id'] for lead in page['leads']]
+            deleted += page['deleted']
+            self.assertGreater(int(page['token']), int(token))
+            token = page['token']
+            if not page['has_more']:
+                break
+        self.assertEqual(leads, [lead['id'] for lead in full['leads']])
+        self.assertEqual(deleted, full['deleted'])
+        self.assertEqual(token, full['token'])
+
+    def test_token_before_purge_is_gone(self):
+        self.create_lead(0).delete()
+        self.assertEqual(purge_tombstones(timezone.now() + timedelta(minutes=1)), 1)
+        response = self.client.get('/leads/changes/', {'since': self.token})
+        self.assertEqual(response.status_code, 410)
+
+        token = self.changes()['token']
+        self.assertEqual(self.changes(since=token)['leads'], [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'номера изменений проставляются триггерами PostgreSQL')
+class LeadChangeTriggersTest(TransactionTestCase):
+    def setUp(self):
+        self.master, self.other_master = [User.objects.create_user(email=f'trigger{i}@example.com') for i in range(2)]
+        self.lead = Lead.objects.create(
+            client_name='Клиент', phone='+996555000000', master=self.master,
+            date_time=timezone.now() + timedelta(days=1),
+        )
+
+    def seq(self):
+        return Lead.objects.get(pk=self.lead.pk).change_seq
+
+    def test_every_change_gets_a_larger_seq(self):
+        created = self.seq()
+        self.lead.services.add(Service.objects.create(name='Маникюр'))
+        after_services = self.seq()
+        self.assertGreater(after_services, created)
+
+        Lead.objects.filter(pk=self.lead.pk).update(reminder_sent_at=timezone.now())
+        self.assertEqual(self.seq(), after_services)
+
+        Lead.objects.filter(pk=self.lead.pk).update(master=self.other_master)
+        moved = LeadTombstone.objects.get(lead_id=self.lead.pk)
+        self.assertEqual(moved.master_id, self.master.pk)
+        self.assertGreater(self.seq(), after_services)
+
+        Lead.objects.filter(pk=self.lead.pk).delete()
+        deleted = LeadTombstone.objects.filter(lead_id=self.lead.pk).latest('change_seq')
+        self.assertEqual(deleted.master_id, self.other_master.pk)
+        self.assertGreater(deleted.change_seq, moved.change_seq)
+
+    def test_changes_of_open_transaction_stay_above_ceiling(self):
+        with transaction.atomic():
+            Lead.objects.filter(pk=self.lead.pk).update(is_confirmed=True)
+            self.assertGreaterEqual(self.seq(), change_seq_ceiling('default'))
+        self.assertLess(self.seq(), change_seq_ceiling('default'))
+
+
+class FakePubSub:
+    def __init__(self, events):
+        self.messages = [{'data': orjson.dumps(event)} for event in events]
+        self.channels = []
+
+    async def subscribe(self, *channels):
+        self.channels.extend(channels)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    async def unsubscribe(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class FakeAsyncRedis:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def pubsub(self):
+        return self._pubsub
+
+    async def aclose(self):
+        pass
+
+
+def event(seq, event_type='updated', lead_id=1):
+    return {'seq': seq, 'type': event_type, 'lead': {'id': lead_id}}
+
+
+class LeadEventsTest(TestCase):
+    def stream(self, live, backlog, master_id=None, last_seq=None):
+        """(id, event) отправленных событий до первого ping, то есть пока не кончились живые сообщения."""
+        pubsub = FakePubSub(live)
+
+        async def collect():
+            sent = []
+            stream = lead_event_stream(master_id, last_seq)
+            async for chunk in stream:
+                if chunk == ': ping\n\n':
+                    break
+                if chunk.startswith('id: '):
+                    lines = chunk.splitlines()
+                    sent.append((int(lines[0][4:]), lines[1][7:]))
+            await stream.aclose()
+            return sent
+
+        with mock.patch('leads.events.aioredis.Redis.from_url', return_value=FakeAsyncRedis(pubsub)), \
+                mock.patch('leads.events.backlog_events', return_value=backlog) as backlog_mock:
+            sent = asyncio.run(collect())
+        return sent, pubsub, backlog_mock
+
+    def test_stream_skips_live_events_already_sent_from_backlog(self):
+        sent, _, _ = self.stream([event(6), event(7)], [event(5), event(6)], last_seq=4)
+        self.assertEqual(sent, [(5, 'updated'), (6, 'updated'), (7, 'updated')])
+
+    def test_stream_sends_reset_when_backlog_is_gone(self):
+        sent, _, _ = self.stream([event(9)], None, last_seq=4)
+        self.assertEqual(sent, [(4, 'reset'), (9, 'updated')])
+
+    def test_stream_for_master_uses_master_channel_and_backlog(self):
+        master_id = uuid.uuid4()
+        _, pubsub, backlog_mock = self.stream([], [], master_id=master_id, last_seq=3)
+        self.assertEqual(pubsub.channels, [lead_events_channel(master_id)])
+        backlog_mock.assert_called_once_with(3, master_id)
+
+    @mock.patch('leads.events.get_redis')
+    def test_publish_goes_to_salon_and_master_channels(self, get_redis):
+        master_id = uuid.uuid4()
+        publish(event(1), master_id)
+        pipe = get_redis.return_value.pipeline.return_value
+        self.assertEqual(
+            [call.args[0] for call in pipe.publish.call_args_list],
+            [lead_events_channel(), lead_events_channel(master_id)],
+        )
+        pipe.execute.assert_called_once()
+
+    @mock.patch('leads.events.publish')
+    def test_events_are_published_after_commit(self, publish_mock):
+        master = User.objects.create_user(email='events@example.com')
+        with self.captureOnCommitCallbacks() as callbacks:
+            lead = Lead.objects.create(client_name='Клиент', phone='+996555000000', master=master,
+                                       date_time=timezone.now() + timedelta(days=1))
+            publish_mock.assert_not_called()
+        for callback in callbacks:
+            callback()
+        published, master_id = publish_mock.call_args.args
+        self.assertEqual((published['type'], published['lead']['id'], master_id), ('created', lead.pk, master.pk))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'номера изменений проставляются триггерами PostgreSQL')
+class LeadEventsBacklogTest(TransactionTestCase):
+    @mock.patch('leads.events.get_redis')
+    def test_backlog_uses_tombstone_seqs_and_master_filter(self, get_redis):
+        master, other = [User.objects.create_user(email=f'backlog{i}@example.com') for i in range(2)]
+        since = current_change_token()
+        start = timezone.now() + timedelta(days=1)
+        kept, removed = [
+            Lead.objects.create(client_name='Клиент', phone='+996555000000', master=master,
+                                date_time=start + timedelta(hours=i))
+            for i in range(2)
+        ]
+        Lead.objects.create(client_name='Клиент', phone='+996555000000', master=other, date_time=start)
+        removed.delete()
+        kept.is_confirmed = True
+        kept.save()
+
+        removed_seq = LeadTombstone.objects.get(lead_id=removed.pk).change_seq
+        kept_seq = Lead.objects.get(pk=kept.pk).change_seq
+        self.assertGreater(kept_seq, removed_seq)
+        events = backlog_events(since, master.pk)
+        self.assertEqual(
+            [(item['seq'], item['type'], item['lead']['id']) for item in events],
+            [(removed_seq, 'deleted', removed.pk), (kept_seq, 'updated', kept.pk)],
+        )
+
+
+class LeadNotificationTest(TestCase):
+    @mock.patch('leads.events.publish')
+    @mock.patch('users.tasks.send_order_message')
+    @mock.patch('users.tasks.send_telegram_message.delay')
+    def test_create_queues_telegram_after_commit(self, delay, send_order_message, publish_mock):
+        master = User.objects.create_user(email='notify@example.com', telegram_chat_id=12345)
+        service = Service.objects.create(name='Маникюр')
+        with self.captureOnCommitCallbacks() as callbacks:
+            LeadSerializer().create({
+                'client_name': 'Клиент', 'phone': '+996555000000', 'master': master,
+                'date_time': timezone.now() + timedelta(days=1), 'services': [service],
+            })
+            delay.assert_not_called()
+        send_order_message.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual([call.args[1:] for call in delay.call_args_list], [(None,), ([12345],)])
+        send_order_message.assert_not_called()
+
+
+class DashboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='manager@example.com'))
+
+    def dashboard(self):
+        response = self.client.post('/reports/dashboard/', {'type': 'month'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_failing_widget_does_not_break_others_or_leak_details(self):
+        def broken(start_date, end_date):
+            raise RuntimeError('relation "leads_secret" does not exist')
+
+        widgets = {name: (lambda start_date, end_date, name=name: name) for name in DASHBOARD_WIDGETS}
+        widgets['financial'] = broken
+        with mock.patch.dict('leads.dashboard.DASHBOARD_WIDGETS', widgets), \
+                self.assertLogs('leads.dashboard', 'ERROR'):
+            response = self.dashboard()
+
+        self.assertEqual(response.data['errors'], {'financial': DASHBOARD_WIDGET_ERROR})
+        self.assertEqual(response.data['widgets'], {name: name for name in DASHBOARD_WIDGETS if name != 'financial'})
+        self.assertNotIn(b'leads_secret', response.content)
+
+    @skipUnless(connection.vendor == 'postgresql', 'виджеты читают материализованные представления PostgreSQL')
+    def test_all_widgets_are_returned(self):
+        data = self.dashboard().data
+        self.assertEqual(data['errors'], {})
+        self.assertEqual(set(data['widgets']), set(DASHBOARD_WIDGETS))
+
+    def test_master_summary_counts_confirmed_leads_of_period(self):
+        master = User.objects.create_user(email='summary@example.com', is_employee=True)
+        start = timezone.now().replace(day=10, hour=12)
+        confirmed = Lead.objects.create(client_name='Клиент', phone='+996555000001', master=master,
+                                        date_time=start, is_confirmed=True)
+        confirmed.services.set([Service.objects.create(name='Маникюр', price=700),
+                                Service.objects.create(name='Дизайн', price=300)])
+        Lead.objects.create(client_name='Клиент', phone='+996555000002', master=master, date_time=start)
+
+        day = timezone.localtime(start).date()
+        self.assertEqual(master_summary(day, day), [{
+            'uuid': str(master.pk), 'full_name': f'{master.first_name} {master.last_name}',
+            'total_clients': 1, 'total_earnings': 1000.0, 'total_leads': 1,
+        }])
@@ -1,14 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
-from .views import AverageBookingsReportView, FinancialReportView, NewClientsReportView, ServiceAvailableSlotsView, ServiceViewSet, LeadViewSet, ClientViewSet, LeadConfirmationViewSet, LeadsApprovalStatsReportView, ServiceMastersWithSlotsView, AvailableDatesView, ClientStatsView, TotalClientsView, LeadStatsView, MyLeadsAPIView
+from .views import AverageBookingsReportView, FinancialReportView, NewClientsReportView, ServiceAvailableSlotsView, ServiceViewSet, LeadViewSet, ClientViewSet, LeadConfirmationViewSet, LeadsApprovalStatsReportView, ServiceMastersWithSlotsView, AvailableDatesView, ClientStatsView, TotalClientsView, LeadStatsView, MyLeadsAPIView, ReportJobViewSet, LeadExportView, ClientExportView, ReportExportView, CohortReportView, MasterUtilizationReportView, BookingHeatmapReportView, ServiceBasketReportView, DashboardReportView, ServiceCatalogView, LeadEventsView
 
 router = SimpleRouter()
 router.register(r'services', ServiceViewSet, basename='service')
 router.register(r'leads', LeadViewSet, basename='lead')
 router.register('clients', ClientViewSet, basename='client')
 router.register('pendings', LeadConfirmationViewSet, basename='pending-confirmation')
+router.register('reports/jobs', ReportJobViewSet, basename='report-job')
 
 urlpatterns = [
+    path('services/catalog/', ServiceCatalogView.as_view(), name='service-catalog'),
+    path('leads/events/', LeadEventsView.as_view(), name='lead-events'),
     path('services/available-slots/', ServiceAvailableSlotsView.as_view(), name='service-available-slots'),
     path('employees/available-slots/', ServiceMastersWithSlotsView.as_view(), name='employees-available-slots'),
     path('', include(router.urls)),
@@ -20,7 +23,15 @@ urlpatterns = [
     path('reports/clients-statistics/', ClientStatsView.as_view(), name='client-stats'),
     path('reports/clients-total/', TotalClientsView.as_view(), name='clients-total'),
     path('reports/lead-statistics/', LeadStatsView.as_view(), name='lead-stats'),
-    path('my-leads/', MyLeadsAPIView.as_view(), name='my-leads')
+    path('reports/dashboard/', DashboardReportView.as_view(), name='dashboard'),
+    path('reports/client-cohorts/', CohortReportView.as_view(), name='client-cohorts'),
+    path('reports/master-utilization/', MasterUtilizationReportView.as_view(), name='master-utilization'),
+    path('reports/booking-heatmap/', BookingHeatmapReportView.as_view(), name='booking-heatmap'),
+    path('reports/service-baskets/', ServiceBasketReportView.as_view(), name='service-baskets'),
+    path('my-leads/', MyLeadsAPIView.as_view(), name='my-leads'),
+    path('export/leads/', LeadExportView.as_view(), name='export-leads'),
+    path('export/clients/', ClientExportView.as_view(), name='export-clients'),
+    path('export/reports/<str:report_type>/', ReportExportView.as_view(), name='export-report'),
 
 
 ]
@@ -1,61 +1,130 @@
+import json
 from datetime import date, timedelta
 from uuid import UUID
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from django.core.exceptions import ValidationError as DjangoValidationError
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
 from rest_framework.filters import SearchFilter
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from asgiref.sync import sync_to_async
 from django.utils.timezone import now
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
 from django.db.models import Q
-from django.utils.dateparse import parse_date
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views import View
 from django.contrib.auth import get_user_model
-from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 from django.utils import timezone
 
+from core.routers import ReplicaReadMixin
+from core.serializers import DynamicFieldsViewMixin
 from users.models import EmployeeSchedule
-from .models import Client, Service, Lead
-from .serializers import ClientSerializer, ServiceSerializer,  LeadSerializer
+from .models import Client, Counter, Service, Lead, ReportJob
+from .pagination import KeysetPagination, UnlimitedLimitOffsetPagination
+from .busy import BUSY_SLOTS_MAX_DAYS, get_busy_slots
+from .changes import (
+    LEAD_CHANGES_DEFAULT_LIMIT, LEAD_CHANGES_MAX_LIMIT, ChangesTokenExpired, current_change_token, lead_changes
+)
+from .catalog import get_catalog
+from .dashboard import build_dashboard
+from .events import lead_event_stream, schedule_lead_events
+from .exports import (
+    CLIENT_EXPORT_COLUMNS, LEAD_EXPORT_COLUMNS, export_clients_queryset, export_leads_queryset,
+    export_response, queryset_rows
+)
+from .reports import (
+    REPORT_BUILDERS, build_report, client_visit_split, cohort_report, financial_report, last_closed_month, lead_status_counts, parse_date,
+    booking_heatmap, datetime_range, resolve_period, service_basket_report, utilization_report
+)
+from .serializers import ClientSerializer, ServiceSerializer,  LeadSerializer, LeadCompactSerializer, ReportJobSerializer
+from .tasks import build_report_job
 from users.serializers import UserGet
 
 from django.utils.timezone import make_aware, datetime
 
 User = get_user_model()
 
+COMPACT_VIEW_PARAMETER = openapi.Parameter(
+    'view', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['compact'], required=False,
+    description="compact — плоский список (id, время, длительность, клиент, мастер, названия услуг) для календаря"
+)
 
-from rest_framework.pagination import LimitOffsetPagination
 
-class UnlimitedLimitOffsetPagination(LimitOffsetPagination):
-    default_limit = 10
-    max_limit = None
+def lead_list_queryset(request, queryset):
+    """Queryset и сериализатор для списков записей с учетом ?view=compact."""
+    if request.query_params.get('view') == 'compact':
+        return queryset.compact(), LeadCompactSerializer
+    return queryset.with_relations(), LeadSerializer
 
-    def paginate_queryset(self, queryset, request, view=None):
-        if request.query_params.get('limit') == 'all':
-            return None
-        return super().paginate_queryset(queryset, request, view)
+
+# Занятость меняется при каждой новой записи, поэтому на клиенте — только короткий кеш.
+BUSY_SLOTS_CACHE_CONTROL = 'public, max-age=30'
+
+DAYS_RU = ('Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье')
+
+
+def _lead_day(lead):
+    date_time, day = (lead['date_time'], lead['date']) if isinstance(lead, dict) else (lead.date_time, lead.date)
+    return timezone.localtime(date_time).date() if date_time else day
+
+
+def calendar_leads(request, start_date, end_date, master_id=None, service_id=None):
+    """
+    Записи за период одним запросом по диапазону date_time (и date для записей без времени),
+    сериализованные с учетом ?view=compact и разложенные по дням: {date: [...]}.
+    """
+    start_dt, end_dt = datetime_range(start_date, end_date)
+    queryset = Lead.objects.filter(
+        Q(date_time__gte=start_dt, date_time__lt=end_dt) |
+        Q(date_time__isnull=True, date__gte=start_date, date__lte=end_date)
+    )
+    if master_id:
+        try:
+            queryset = queryset.filter(master_id=UUID(master_id))
+        except ValueError:
+            raise ValueError('Неверный master_id')
+    if service_id:
+        try:
+            service_id = int(service_id)
+        except ValueError:
+            raise ValueError('Неверный service_id')
+        # подзапросом, а не join по services: иначе в compact попадут названия только этой услуги
+        queryset = queryset.filter(id__in=Lead.services.through.objects.filter(service_id=service_id).values('lead_id'))
+
+    queryset, serializer_class = lead_list_queryset(request, queryset.order_by('date_time', 'id'))
+    leads = list(queryset)
+    leads_by_day = {}
+    for lead, data in zip(leads, serializer_class(leads, many=True).data):
+        leads_by_day.setdefault(_lead_day(lead), []).append(data)
+    return leads_by_day
 
 
 class ClientViewSet(viewsets.ModelViewSet):
-    queryset = Client.objects.all()
+    queryset = Client.objects.with_stats()
     serializer_class = ClientSerializer
+    pagination_class = KeysetPagination
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(DynamicFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = ServiceSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = UnlimitedLimitOffsetPagination
 
+    queryset = Service.objects.with_relations()
     filter_backends = (SearchFilter,)
     search_fields = ('name', )
 
     def get_queryset(self):
-        queryset = Service.objects.all()
+        queryset = super().get_queryset()
         if self.action == "list":
             include_additional = self.request.query_params.get("include_additional")
             if not include_additional:
@@ -63,10 +132,62 @@ class ServiceViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class LeadViewSet(viewsets.ModelViewSet):
-    queryset = Lead.objects.all()
+class ServiceCatalogView(APIView):
+    permission_classes = [permissions.AllowAny]
+    # Без ?v= каталог можно кешировать недолго и перепроверять по ETag,
+    # с ?v=<текущая версия> ответ неизменяем.
+    CACHE_CONTROL = 'public, max-age=60, stale-while-revalidate=600'
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+    @swagger_auto_schema(
+        operation_description="Каталог всех услуг с вложенными additional_services и parent_services. "
+                              "Отдается из заранее собранного JSON, поддерживает ETag/If-None-Match. "
+                              "Ссылки на изображения абсолютные.",
+        manual_parameters=[
+            openapi.Parameter('v', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Версия каталога (поле version ответа)")
+        ],
+        tags=['Услуги']
+    )
+    def get(self, request):
+        catalog = get_catalog(request)
+        etag = f'"{catalog["version"]}"'
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in (tag.strip() for tag in if_none_match.split(',')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(catalog['body'], content_type='application/json')
+        response['ETag'] = etag
+        if request.query_params.get('v') == catalog['version']:
+            response['Cache-Control'] = self.IMMUTABLE_CACHE_CONTROL
+        else:
+            response['Cache-Control'] = self.CACHE_CONTROL
+        return response
+
+
+class LeadViewSet(DynamicFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Lead.objects.with_relations()
     serializer_class = LeadSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+
+    def is_compact_list(self):
+        return self.action == 'list' and self.request.query_params.get('view') == 'compact'
+
+    def get_queryset(self):
+        if self.is_compact_list():
+            return Lead.objects.compact()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.is_compact_list():
+            return LeadCompactSerializer
+        return super().get_serializer_class()
+
+    @swagger_auto_schema(manual_parameters=[COMPACT_VIEW_PARAMETER], tags=['Записи'])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -80,13 +201,90 @@ class LeadViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+    @swagger_auto_schema(
+        operation_description="Занятые интервалы мастеров за период (до 31 дня) с учетом буферов: "
+                              "30 минут до и 10 минут после записи. "
+                              "Ответ: {masters: {master_id: [[начало, конец], ...]}}.",
+        manual_parameters=[
+            openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description="Начало периода (YYYY-MM-DD)"),
+            openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description="Конец периода включительно (YYYY-MM-DD)"),
+            openapi.Parameter('master_ids', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="ID мастеров через запятую"),
+        ],
+        tags=['Записи']
+    )
     @action(detail=False, methods=["get"], permission_classes=[permissions.AllowAny])
     def busy_slots(self, request):
-        busy_leads = Lead.objects.values("date_time", "master_id")
-        
-        return Response(busy_leads)
+        params = request.query_params
+        try:
+            if not (params.get('start_date') and params.get('end_date')):
+                raise ValueError('Нужно указать и start_date, и end_date')
+            start_date = parse_date(params['start_date'])
+            end_date = parse_date(params['end_date'])
+            if start_date > end_date:
+                raise ValueError('start_date не может быть позже end_date')
+            if (end_date - start_date).days >= BUSY_SLOTS_MAX_DAYS:
+                raise ValueError(f'Период не может превышать {BUSY_SLOTS_MAX_DAYS} дней')
+            master_ids = None
+            if params.get('master_ids'):
+                master_ids = {str(UUID(m.strip())) for m in params['master_ids'].split(',') if m.strip()}
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'masters': get_busy_slots(start_date, end_date, master_ids),
+        })
+        response['Cache-Control'] = BUSY_SLOTS_CACHE_CONTROL
+        return response
 
 
+    @swagger_auto_schema(
+        operation_description="Изменения записей после токена since для синхронизации календарей. "
+                              "Без since возвращается только текущий token: получите его до загрузки расписания. "
+                              "Ответ: token (передать в следующий since), has_more, leads — измененные и новые записи "
+                              "по возрастанию номера изменения, deleted — id удаленных записей. "
+                              "410 — токен устарел, расписание нужно загрузить заново.",
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Токен из предыдущего ответа"),
+            openapi.Parameter('master_id', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+                              description="Только записи мастера"),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=False,
+                              description=f"Количество изменений в ответе (до {LEAD_CHANGES_MAX_LIMIT})"),
+            COMPACT_VIEW_PARAMETER,
+        ],
+        tags=['Записи']
+    )
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
+    def changes(self, request):
+        params = request.query_params
+        try:
+            since = int(params['since']) if params.get('since') else None
+            limit = min(max(int(params.get('limit', LEAD_CHANGES_DEFAULT_LIMIT)), 1), LEAD_CHANGES_MAX_LIMIT)
+            master_id = UUID(params['master_id']) if params.get('master_id') else None
+        except ValueError:
+            return Response({'error': 'Неверные параметры since, limit или master_id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if since is None:
+            return Response({'token': str(current_change_token()), 'has_more': False, 'leads': [], 'deleted': []})
+
+        try:
+            leads, deleted, token, has_more = lead_changes(since, Lead.objects.all(), limit, master_id)
+        except ChangesTokenExpired:
+            return Response({'error': 'Токен устарел, загрузите расписание заново'}, status=status.HTTP_410_GONE)
+
+        leads, serializer_class = lead_list_queryset(request, leads)
+        return Response({
+            'token': str(token),
+            'has_more': has_more,
+            'leads': serializer_class(leads, many=True).data,
+            'deleted': [pk for pk, _ in deleted],
+        })
+
     @swagger_auto_schema(
     manual_parameters=[
         openapi.Parameter(
@@ -108,7 +306,8 @@ class LeadViewSet(viewsets.ModelViewSet):
             description="ID услуги для фильтрации",
             type=openapi.TYPE_INTEGER,
             required=False
-        )
+        ),
+        COMPACT_VIEW_PARAMETER
     ],
     responses={
         200: openapi.Response(
@@ -139,58 +338,35 @@ class LeadViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def weekly_leads(self, request):
         date_str = request.query_params.get('date')
-        master_uuid = request.query_params.get('master_uuid')
+        # master_uuid — старое имя параметра
+        master_id = request.query_params.get('master_id') or request.query_params.get('master_uuid')
         service_id = request.query_params.get('service_id')
-        
+
         try:
-            input_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            monday = input_date - timedelta(days=input_date.weekday())
-            
-            days_ru = {
-                0: 'Понедельник', 
-                1: 'Вторник', 
-                2: 'Среда', 
-                3: 'Четверг', 
-                4: 'Пятница', 
-                5: 'Суббота', 
-                6: 'Воскресенье'
-            }
-            
-            weekly_leads_data = []
-            for i in range(7):
-                current_day = monday + timedelta(days=i)
-                
-                qs = Lead.objects.filter(date_time__date=current_day)
-                
-                if master_uuid:
-                    try:
-                        uuid = UUID(master_uuid)
-                        qs = qs.filter(master__uuid=uuid)
-                    except ValueError:
-                        qs = Lead.objects.none()
-
-                if service_id:
-                    qs = qs.filter(services__id=service_id)
-                
-                serialized_leads = LeadSerializer(qs, many=True).data
-                
-                day_data = {
-                    'date': current_day.strftime('%Y-%m-%d'),
-                    'day': days_ru[i],
-                    'leads': serialized_leads
-                }
-                
-                weekly_leads_data.append(day_data)
-            
-            return Response({'days': weekly_leads_data})
-        
+            input_date = datetime.strptime(date_str or '', '%Y-%m-%d').date()
         except ValueError:
             return Response(
                 {"error": "Неверный формат даты. Используйте YYYY-MM-DD"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        monday = input_date - timedelta(days=input_date.weekday())
+        try:
+            leads_by_day = calendar_leads(request, monday, monday + timedelta(days=6), master_id, service_id)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        weekly_leads_data = []
+        for i in range(7):
+            current_day = monday + timedelta(days=i)
+            weekly_leads_data.append({
+                'date': current_day.strftime('%Y-%m-%d'),
+                'day': DAYS_RU[i],
+                'leads': leads_by_day.get(current_day, [])
+            })
+
+        return Response({'days': weekly_leads_data})
+
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter(
@@ -212,7 +388,8 @@ class LeadViewSet(viewsets.ModelViewSet):
                 description="ID услуги для фильтрации",
                 type=openapi.TYPE_INTEGER,
                 required=False
-            )
+            ),
+            COMPACT_VIEW_PARAMETER
         ],
         responses={
             200: openapi.Schema(
@@ -234,44 +411,26 @@ class LeadViewSet(viewsets.ModelViewSet):
         date_str = request.query_params.get('date')
         master_id = request.query_params.get('master_id')
         service_id = request.query_params.get('service_id')
-        
+
         try:
-            input_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            days_ru = {
-                0: 'Понедельник', 
-                1: 'Вторник', 
-                2: 'Среда', 
-                3: 'Четверг', 
-                4: 'Пятница', 
-                5: 'Суббота', 
-                6: 'Воскресенье'
-            }
-            
-            daily_leads_query = Lead.objects.filter(date_time__date=input_date)
-            
-            if master_id:
-                daily_leads_query = daily_leads_query.filter(master_id=master_id)
-                
-            if service_id:
-                daily_leads_query = daily_leads_query.filter(service_id=service_id)
-            
-            serialized_leads = LeadSerializer(daily_leads_query, many=True).data
-            
-            day_data = {
-                'date': input_date.strftime('%Y-%m-%d'),
-                'day': days_ru[input_date.weekday()],
-                'leads': serialized_leads
-            }
-            
-            return Response(day_data)
-        
+            input_date = datetime.strptime(date_str or '', '%Y-%m-%d').date()
         except ValueError:
             return Response(
                 {"error": "Неверный формат даты. Используйте YYYY-MM-DD"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            leads_by_day = calendar_leads(request, input_date, input_date, master_id, service_id)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'date': input_date.strftime('%Y-%m-%d'),
+            'day': DAYS_RU[input_date.weekday()],
+            'leads': leads_by_day.get(input_date, [])
+        })
+
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter(
@@ -1003,14 +1162,16 @@ class AvailableDatesView(APIView):
 
 class LeadConfirmationViewSet(viewsets.ViewSet):
     @swagger_auto_schema(
+    manual_parameters=[COMPACT_VIEW_PARAMETER],
     responses={200: "Список неподтвержденных лидов"})
     @action(detail=False, methods=['get'])
     def pending(self, request):
         pending_leads = Lead.objects.filter(is_confirmed=None).order_by('-created_at')
+        pending_leads, serializer_class = lead_list_queryset(request, pending_leads)
 
-        paginator = PageNumberPagination()
+        paginator = KeysetPagination()
         paginated_leads = paginator.paginate_queryset(pending_leads, request)
-        data = LeadSerializer(paginated_leads, many=True).data
+        data = serializer_class(paginated_leads, many=True).data
         return paginator.get_paginated_response(data)
 
     @swagger_auto_schema(
@@ -1034,7 +1195,12 @@ class LeadConfirmationViewSet(viewsets.ViewSet):
         if not isinstance(lead_ids, list):
             return Response({"error": "Неверный формат данных"}, status=status.HTTP_400_BAD_REQUEST)
 
-        updated_leads = Lead.objects.filter(id__in=lead_ids, is_confirmed=None).update(is_confirmed=True)
+        with transaction.atomic():
+            pending_ids = list(
+                Lead.objects.filter(id__in=lead_ids, is_confirmed=None).select_for_update().values_list('id', flat=True)
+            )
+            updated_leads = Lead.objects.filter(id__in=pending_ids).update(is_confirmed=True)
+            schedule_lead_events(pending_ids, 'confirmed')
 
         return Response({
             "message": f"Успешно подтверждено {updated_leads} лидов"
@@ -1061,7 +1227,12 @@ class LeadConfirmationViewSet(viewsets.ViewSet):
         if not isinstance(lead_ids, list):
             return Response({"error": "Неверный формат данных"}, status=status.HTTP_400_BAD_REQUEST)
 
-        updated_leads = Lead.objects.filter(id__in=lead_ids, is_confirmed=None).update(is_confirmed=False)
+        with transaction.atomic():
+            pending_ids = list(
+                Lead.objects.filter(id__in=lead_ids, is_confirmed=None).select_for_update().values_list('id', flat=True)
+            )
+            updated_leads = Lead.objects.filter(id__in=pending_ids).update(is_confirmed=False)
+            schedule_lead_events(pending_ids, 'rejected')
 
         return Response({
             "message": f"Успешно отклонено {updated_leads} лидов"
@@ -1069,7 +1240,7 @@ class LeadConfirmationViewSet(viewsets.ViewSet):
 
 
 
-class FinancialReportView(APIView):
+class FinancialReportView(ReplicaReadMixin, APIView):
     @swagger_auto_schema(
         operation_description="Генерация финансового отчета для графиков по дням или неделям",
         request_body=openapi.Schema(
@@ -1119,34 +1290,15 @@ class FinancialReportView(APIView):
                 return Response({'error': f'Неверный тип периода: {report_type}'}, status=400)
 
             if (end_date - start_date).days > 92:
-                return Response({'error': 'Максимальный период — 3 месяца'}, status=400)
-
-            result_data = []
-
-            if group_by == 'day':
-                current_date = start_date
-                while current_date <= end_date:
-                    total = self._get_total_for_range(current_date, current_date)
-                    result_data.append({
-                        'date': current_date.strftime('%Y-%m-%d'),
-                        'total_amount': float(total)
-                    })
-                    current_date += timedelta(days=1)
-
-            elif group_by == 'week':
-                current_start = start_date
-                while current_start <= end_date:
-                    current_end = min(current_start + timedelta(days=6), end_date)
-                    total = self._get_total_for_range(current_start, current_end)
-                    result_data.append({
-                        'week_start': current_start.strftime('%Y-%m-%d'),
-                        'week_end': current_end.strftime('%Y-%m-%d'),
-                        'total_amount': float(total)
-                    })
-                    current_start += timedelta(days=7)
-            else:
+                return Response({
+                    'error': 'Максимальный период — 3 месяца. Для больших периодов используйте /reports/jobs/'
+                }, status=400)
+
+            if group_by not in ('day', 'week'):
                 return Response({'error': 'Параметр group_by должен быть "day" или "week"'}, status=400)
 
+            report = financial_report(start_date, end_date, group_by)
+
             return Response({
                 'period': {
                     'start_date': start_date.strftime('%Y-%m-%d'),
@@ -1154,7 +1306,7 @@ class FinancialReportView(APIView):
                     'type': report_type
                 },
                 'group_by': group_by,
-                'data': result_data
+                'data': report['data']
             })
 
         except ValueError as e:
@@ -1162,22 +1314,67 @@ class FinancialReportView(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=500)
 
-    def _get_total_for_range(self, start_date, end_date):
-        start_dt = datetime.combine(start_date, datetime.min.time())
-        end_dt = datetime.combine(end_date, datetime.max.time())
 
-        leads = Lead.objects.filter(
-            is_confirmed=True,
-            date_time__gte=start_dt,
-            date_time__lte=end_dt
-        )
+class ReportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                       mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Отчеты и их файлы видит только тот, кто их заказал
+        if getattr(self, 'swagger_fake_view', False):
+            return ReportJob.objects.none()
+        return ReportJob.objects.filter(created_by=self.request.user)
+
+    @swagger_auto_schema(
+        operation_description="Поставить отчет в очередь. Период не ограничен, расчет выполняется в Celery.",
+        request_body=ReportJobSerializer,
+        responses={202: ReportJobSerializer},
+        tags=['Финансовые отчеты']
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save(created_by=request.user)
+        transaction.on_commit(lambda: build_report_job.delay(str(job.pk)))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'output',
+                openapi.IN_QUERY,
+                description="Формат файла: csv или json (по умолчанию csv)",
+                type=openapi.TYPE_STRING,
+                enum=['csv', 'json'],
+                required=False
+            )
+        ],
+        responses={200: "Файл отчета", 409: "Отчет еще не готов"},
+        tags=['Финансовые отчеты']
+    )
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'done':
+            return Response({'error': 'Отчет еще не готов', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+
+        output = request.query_params.get('output', 'csv')
+        filename = f'{job.report_type}-{job.pk}'
+        if output == 'json':
+            response = HttpResponse(
+                json.dumps(job.result, cls=DjangoJSONEncoder, ensure_ascii=False),
+                content_type='application/json'
+            )
+            response['Content-Disposition'] = f'attachment; filename="{filename}.json"'
+            return response
+        if output == 'csv':
+            return FileResponse(job.csv_file.open('rb'), as_attachment=True, filename=f'{filename}.csv',
+                                content_type='text/csv')
+        return Response({'error': 'Параметр output должен быть "csv" или "json"'}, status=status.HTTP_400_BAD_REQUEST)
 
-        total = Decimal('0.00')
-        for lead in leads:
-            total += sum((s.price for s in lead.services.all()), Decimal('0.00'))
-        return total
 
-class ClientStatsView(APIView):
+class ClientStatsView(ReplicaReadMixin, APIView):
     @swagger_auto_schema(
         operation_description="Получить соотношение новых и возвращающихся клиентов за указанный период.",
         request_body=openapi.Schema(
@@ -1248,29 +1445,7 @@ class ClientStatsView(APIView):
                 return Response({"error": "Неверный тип периода. Используйте 'day', 'week' или 'month'."},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            start_datetime = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
-            end_datetime = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
-
-            leads_in_period = Lead.objects.filter(
-                is_confirmed=True,
-                date_time__range=(start_datetime, end_datetime),
-                client__isnull=False
-            )
-
-            new_clients = 0
-            returning_clients = 0
-
-            for lead in leads_in_period.select_related('client'):
-                client = lead.client
-                first_lead = Lead.objects.filter(
-                    client=client,
-                    is_confirmed=True
-                ).order_by('date_time').first()
-
-                if first_lead and start_datetime <= first_lead.date_time <= end_datetime:
-                    new_clients += 1
-                else:
-                    returning_clients += 1
+            split = client_visit_split(start_date, end_date)
 
             return Response({
                 "period": {
@@ -1278,21 +1453,18 @@ class ClientStatsView(APIView):
                     "end_date": end_date.strftime('%Y-%m-%d'),
                     "type": report_type
                 },
-                "data": {
-                    "new_clients": new_clients,
-                    "returning_clients": returning_clients
-                }
+                "data": split
             })
 
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class TotalClientsView(APIView):
+class TotalClientsView(ReplicaReadMixin, APIView):
     def get(self, request):
-        cleints_count = Client.objects.all().count()
+        cleints_count = Counter.get_value('clients_total')
         return Response({'total_clients': cleints_count})
 
-class LeadStatsView(APIView):
+class LeadStatsView(ReplicaReadMixin, APIView):
     @swagger_auto_schema(
         operation_description="Получить отчет по подтвержденным и неподтвержденным записям за указанный период (неделя/месяц).",
         request_body=openapi.Schema(
@@ -1361,15 +1533,9 @@ class LeadStatsView(APIView):
                 return Response({"error": "Неверный тип периода. Используйте 'week' или 'month'."},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-
-            leads_in_period = Lead.objects.filter(
-                date_time__range=(start_datetime, end_datetime)
-            )
-
-            confirmed_leads = leads_in_period.filter(is_confirmed=True).count()
-            unconfirmed_leads = leads_in_period.filter(is_confirmed=False).count()
+            counts = lead_status_counts(start_date, end_date)
+            confirmed_leads = counts['confirmed']
+            unconfirmed_leads = counts['rejected']
 
             return Response({
                 "period": {
@@ -1387,7 +1553,7 @@ class LeadStatsView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         
-class NewClientsReportView(APIView):
+class NewClientsReportView(ReplicaReadMixin, APIView):
     @swagger_auto_schema(
         operation_description="Генерация отчета о новых клиентах за указанный период",
         request_body=openapi.Schema(
@@ -1519,7 +1685,7 @@ class NewClientsReportView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class AverageBookingsReportView(APIView):
+class AverageBookingsReportView(ReplicaReadMixin, APIView):
     @swagger_auto_schema(
         operation_description="Генерация отчета о среднем количестве записей за день, неделю или месяц",
         request_body=openapi.Schema(
@@ -1588,11 +1754,7 @@ class AverageBookingsReportView(APIView):
                 end_date = (start_date + relativedelta(months=1)) - timedelta(days=1)
 
             period_days = (end_date - start_date).days + 1
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-
-            leads = Lead.objects.filter(date_time__range=(start_datetime, end_datetime))
-            total_bookings = leads.count()
+            total_bookings = sum(lead_status_counts(start_date, end_date).values())
             average_bookings_per_day = round(total_bookings / period_days, 2) if period_days > 0 else 0
 
             return Response({
@@ -1612,7 +1774,7 @@ class AverageBookingsReportView(APIView):
             return Response({'error': str(e)}, status=500)
         
 
-class LeadsApprovalStatsReportView(APIView):
+class LeadsApprovalStatsReportView(ReplicaReadMixin, APIView):
     @swagger_auto_schema(
         operation_description="Отчет по соотношению одобренных и отклоненных заявок за день, неделю, месяц или свой период",
         request_body=openapi.Schema(
@@ -1703,12 +1865,9 @@ class LeadsApprovalStatsReportView(APIView):
                         'error': f'Неверный тип отчета: {report_type}. Должен быть "day", "week" или "month"'
                     }, status=status.HTTP_400_BAD_REQUEST)
 
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.max.time())
-
-            leads = Lead.objects.filter(date_time__range=(start_datetime, end_datetime))
-            approved = leads.filter(is_confirmed=True).count()
-            rejected = leads.filter(is_confirmed=False).count()
+            counts = lead_status_counts(start_date, end_date)
+            approved = counts['confirmed']
+            rejected = counts['rejected']
             total = approved + rejected
 
             approval_rate = round((approved / total) * 100, 2) if total > 0 else 0
@@ -1735,6 +1894,8 @@ class LeadsApprovalStatsReportView(APIView):
 
 class MyLeadsAPIView(APIView):
     permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(manual_parameters=[COMPACT_VIEW_PARAMETER])
     def get(self, request):
         user = request.user
         leads = Lead.objects.filter(
@@ -1742,5 +1903,385 @@ class MyLeadsAPIView(APIView):
         ).filter(
         Q(is_confirmed=False) | Q(is_confirmed__isnull=True)
         )
-        serializer = LeadSerializer(leads, many=True)
+        leads, serializer_class = lead_list_queryset(request, leads)
+        serializer = serializer_class(leads, many=True)
         return Response(serializer.data)
+
+
+class LeadEventsView(View):
+    """
+    Поток событий по записям (Server-Sent Events): created, updated, confirmed, rejected, deleted;
+    reset — пропущено слишком много, расписание нужно загрузить заново.
+    Работает только под ASGI (uvicorn core.asgi:application), события раздаются через Redis pub/sub.
+
+    ?master_id= — только записи мастера (мастер без роли менеджера/директора получает только свои).
+    Продолжение после обрыва — по заголовку Last-Event-ID или ?last_event_id=.
+    Токен JWT — в Authorization или ?token= (EventSource не умеет передавать заголовки).
+    """
+    SALON_ROLES = ('manager', 'director')
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'error': 'Поток событий доступен только через ASGI'}, status=501)
+
+        user = await sync_to_async(self.authenticate)(request)
+        if user is None:
+            return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+
+        try:
+            master_id = UUID(request.GET['master_id']) if request.GET.get('master_id') else None
+            last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+            last_seq = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return JsonResponse({'error': 'Неверные параметры master_id или last_event_id'}, status=400)
+        if not (user.is_staff or user.role in self.SALON_ROLES):
+            master_id = user.pk
+
+        response = StreamingHttpResponse(lead_event_stream(master_id, last_seq), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def authenticate(request):
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else request.GET.get('token', '').encode()
+        if not raw_token:
+            return None
+        try:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+
+class DashboardReportView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Все виджеты дашборда менеджера за период одним запросом: выручка по дням, "
+                              "статусы записей, новые/вернувшиеся клиенты, всего клиентов, итоги и загрузка мастеров. "
+                              "Ошибка виджета попадает в errors, остальные виджеты возвращаются. "
+                              "В режиме DEBUG добавляется timings — время каждого виджета в мс.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'type': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="Тип периода, если не заданы start_date/end_date",
+                    enum=['day', 'week', 'month', 'quarter'],
+                    default='month'
+                ),
+                'date': openapi.Schema(type=openapi.TYPE_STRING, format='date',
+                                       description="Базовая дата в формате YYYY-MM-DD"),
+                'start_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'end_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+            }
+        ),
+        tags=['Дашборд']
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            start_date, end_date, period_type = resolve_period(request.data)
+        except ValueError as e:
+            return Response({'error': f'Неверные параметры периода: {str(e)}'}, status=400)
+
+        if (end_date - start_date).days > 92:
+            return Response({'error': 'Максимальный период — 3 месяца'}, status=400)
+
+        return Response({
+            'period': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d'),
+                'type': period_type
+            },
+            **build_dashboard(start_date, end_date)
+        })
+
+
+class CohortReportView(ReplicaReadMixin, APIView):
+    @swagger_auto_schema(
+        operation_description="Когорты клиентов по месяцу первого подтвержденного визита и доля возвратов "
+                              "в следующие месяцы. Учитываются только закрытые месяцы, по умолчанию — последние 12.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'start_date': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="Первый месяц когорт (YYYY-MM-DD, день игнорируется)",
+                    format='date'
+                ),
+                'end_date': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="Последний месяц (YYYY-MM-DD, день игнорируется)",
+                    format='date'
+                ),
+            }
+        ),
+        tags=['Отчеты по клиентам']
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            data = request.data
+            end_date = parse_date(data['end_date']) if data.get('end_date') else last_closed_month()
+            if data.get('start_date'):
+                start_date = parse_date(data['start_date'])
+            else:
+                start_date = end_date.replace(day=1) - relativedelta(months=11)
+
+            if start_date > end_date:
+                return Response({'error': 'start_date не может быть позже end_date'}, status=400)
+
+            report = cohort_report(start_date, end_date)
+            return Response({
+                'period': {
+                    'start_date': start_date.replace(day=1).strftime('%Y-%m-%d'),
+                    'end_date': end_date.strftime('%Y-%m-%d'),
+                    'type': 'custom'
+                },
+                'cohorts': report['cohorts'],
+                'data': report['data']
+            })
+
+        except ValueError as e:
+            return Response({'error': f'Неверный формат даты: {str(e)}'}, status=400)
+
+
+class MasterUtilizationReportView(ReplicaReadMixin, APIView):
+    @swagger_auto_schema(
+        operation_description="Загрузка мастеров по дням: минуты по графику, занятые минуты и процент загрузки",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'type': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="Тип периода, если не заданы start_date/end_date",
+                    enum=['day', 'week', 'month', 'quarter', 'year'],
+                    default='month'
+                ),
+                'date': openapi.Schema(type=openapi.TYPE_STRING, format='date',
+                                       description="Базовая дата в формате YYYY-MM-DD"),
+                'start_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'end_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'master_ids': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Items(type=openapi.TYPE_STRING),
+                    description="UUID мастеров (по умолчанию все)"
+                ),
+            }
+        ),
+        tags=['Отчеты по мастерам']
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            start_date, end_date, report_type = resolve_period(request.data)
+            master_ids = [UUID(str(m)) for m in request.data.get('master_ids') or []]
+            report = utilization_report(start_date, end_date, master_ids)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'period': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d'),
+                'type': report_type
+            },
+            'masters': report['masters'],
+            'data': report['data']
+        })
+
+
+class BookingHeatmapReportView(ReplicaReadMixin, APIView):
+    @swagger_auto_schema(
+        operation_description="Тепловая карта записей 7×24: строки — дни недели (пн-вс), столбцы — часы",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'type': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="Тип периода, если не заданы start_date/end_date",
+                    enum=['day', 'week', 'month', 'quarter', 'year'],
+                    default='month'
+                ),
+                'date': openapi.Schema(type=openapi.TYPE_STRING, format='date',
+                                       description="Базовая дата в формате YYYY-MM-DD"),
+                'start_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'end_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'master_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_STRING)),
+                'service_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_INTEGER)),
+                'weight': openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="count — количество записей, minutes — занятые минуты",
+                    enum=['count', 'minutes'],
+                    default='count'
+                ),
+            }
+        ),
+        tags=['Отчеты по записям']
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            start_date, end_date, report_type = resolve_period(request.data)
+            master_ids = [UUID(str(m)) for m in request.data.get('master_ids') or []]
+            service_ids = [int(s) for s in request.data.get('service_ids') or []]
+            report = booking_heatmap(start_date, end_date, master_ids, service_ids,
+                                     request.data.get('weight', 'count'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'period': {
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d'),
+                'type': report_type
+            },
+            'weight': report['weight'],
+            'max': report['max'],
+            'matrix': report['matrix']
+        })
+
+
+class ServiceBasketReportView(ReplicaReadMixin, APIView):
+    @swagger_auto_schema(
+        operation_description="Какие услуги берут вместе: пары услуг в одной подтвержденной записи "
+                              "с support, confidence и lift. Без периода — по всей истории (предрасчет раз в сутки), "
+                              "период — не больше 3 месяцев.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'start_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'end_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'min_count': openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description="Минимальное количество совместных покупок пары (не меньше 2)",
+                    default=2
+                ),
+            }
+        ),
+        tags=['Отчеты по услугам']
+    )
+    def post(self, request, *args, **kwargs):
+        data = request.data
+        try:
+            start_date = parse_date(data['start_date']) if data.get('start_date') else None
+            end_date = parse_date(data['end_date']) if data.get('end_date') else None
+            if bool(start_date) != bool(end_date):
+                raise ValueError('Нужно указать и start_date, и end_date')
+            if start_date and (end_date - start_date).days > 92:
+                raise ValueError('Максимальный период — 3 месяца. Для больших периодов используйте /reports/jobs/')
+            report = service_basket_report(start_date, end_date, data.get('min_count', 2))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'period': {
+                'start_date': start_date.strftime('%Y-%m-%d') if start_date else None,
+                'end_date': end_date.strftime('%Y-%m-%d') if end_date else None,
+                'type': 'custom' if start_date else 'all'
+            },
+            'min_count': report['min_count'],
+            'data': report['data']
+        })
+
+
+EXPORT_PARAMETERS = [
+    openapi.Parameter('start_date', openapi.IN_QUERY, description="Начало периода (YYYY-MM-DD)",
+                      type=openapi.TYPE_STRING, required=False),
+    openapi.Parameter('end_date', openapi.IN_QUERY, description="Конец периода (YYYY-MM-DD)",
+                      type=openapi.TYPE_STRING, required=False),
+    openapi.Parameter('master_ids', openapi.IN_QUERY, description="UUID мастеров через запятую",
+                      type=openapi.TYPE_STRING, required=False),
+    openapi.Parameter('output', openapi.IN_QUERY, description="Формат файла: csv или xlsx (по умолчанию csv)",
+                      type=openapi.TYPE_STRING, enum=['csv', 'xlsx'], required=False),
+]
+
+
+class BaseExportView(ReplicaReadMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_export_params(self, request):
+        params = request.query_params
+        start_date = end_date = None
+        if params.get('start_date') or params.get('end_date'):
+            if not (params.get('start_date') and params.get('end_date')):
+                raise ValueError('Нужно указать и start_date, и end_date')
+            start_date = parse_date(params['start_date'])
+            end_date = parse_date(params['end_date'])
+
+        master_ids = [UUID(m) for m in params.get('master_ids', '').split(',') if m.strip()]
+
+        output = params.get('output', 'csv')
+        if output not in ('csv', 'xlsx'):
+            raise ValueError('Параметр output должен быть "csv" или "xlsx"')
+        return start_date, end_date, master_ids, output
+
+
+class LeadExportView(BaseExportView):
+    @swagger_auto_schema(
+        operation_description="Потоковая выгрузка записей в CSV/XLSX",
+        manual_parameters=EXPORT_PARAMETERS,
+        tags=['Выгрузки']
+    )
+    def get(self, request):
+        try:
+            start_date, end_date, master_ids, output = self.get_export_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = export_leads_queryset(start_date, end_date, master_ids)
+        return export_response(queryset_rows(queryset), LEAD_EXPORT_COLUMNS, 'leads', output)
+
+
+class ClientExportView(BaseExportView):
+    @swagger_auto_schema(
+        operation_description="Потоковая выгрузка клиентов в CSV/XLSX. "
+                              "Период фильтрует по дате создания, мастера — по клиентам их записей.",
+        manual_parameters=EXPORT_PARAMETERS,
+        tags=['Выгрузки']
+    )
+    def get(self, request):
+        try:
+            start_date, end_date, master_ids, output = self.get_export_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = export_clients_queryset(start_date, end_date, master_ids)
+        return export_response(queryset_rows(queryset), CLIENT_EXPORT_COLUMNS, 'clients', output)
+
+
+class ReportExportView(BaseExportView):
+    # Отчет строится прямо в запросе, длинные периоды — через ReportJob
+    MAX_PERIOD_DAYS = 92
+
+    @swagger_auto_schema(
+        operation_description="Выгрузка данных отчета в CSV/XLSX. "
+                              "Дополнительные параметры отчета (например group_by) передаются в query.",
+        manual_parameters=EXPORT_PARAMETERS + [
+            openapi.Parameter('service_ids', openapi.IN_QUERY, description="ID услуг через запятую (heatmap)",
+                              type=openapi.TYPE_STRING, required=False),
+        ],
+        tags=['Выгрузки']
+    )
+    def get(self, request, report_type):
+        if report_type not in REPORT_BUILDERS:
+            return Response({'error': f'Неизвестный тип отчета: {report_type}'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            _, _, master_ids, output = self.get_export_params(request)
+            params = request.query_params.dict()
+            # списки в query передаются через запятую, построители отчетов ждут list
+            if master_ids:
+                params['master_ids'] = [str(m) for m in master_ids]
+            if params.get('service_ids'):
+                params['service_ids'] = [int(s) for s in params['service_ids'].split(',') if s.strip()]
+            start_date, end_date, _ = resolve_period(params)
+            if (end_date - start_date).days > self.MAX_PERIOD_DAYS:
+                return Response({
+                    'error': 'Максимальный период — 3 месяца. Для больших периодов используйте /reports/jobs/'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            payload = build_report(report_type, params)
+        except ValueError:
+            return Response({'error': 'Неверные параметры отчета'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = payload.get('data') or []
+        columns = [(name, name) for name in (rows[0].keys() if rows else ())]
+        return export_response(iter(rows), columns, report_type, output)
@@ -1,6 +1,7 @@
 import uuid 
 from datetime import time
 from django.db import models
+from django.db.models import Prefetch
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 
 from leads.models import Service
@@ -33,6 +34,14 @@ WEEKDAY_RUSSIAN = {
 }
 
 
+def profile_prefetches():
+    """Услуги (с вложенными связями) и расписание, которые отдает UserSerializer."""
+    return (
+        Prefetch('services', queryset=Service.objects.with_relations()),
+        'schedule',
+    )
+
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -54,6 +63,9 @@ class CustomUserManager(BaseUserManager):
 
         return self.create_user(email, password, **extra_fields)
 
+    def with_profile(self):
+        return self.get_queryset().prefetch_related(*profile_prefetches())
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
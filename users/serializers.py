@@ -2,12 +2,15 @@ import json
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
 from django.http import QueryDict
 
-from .models import WEEKDAY_RUSSIAN, User, EmployeeSchedule
+from core.serializers import DynamicFieldsMixin
+from .models import WEEKDAY_RUSSIAN, User, EmployeeSchedule, profile_prefetches
 from leads.models import Service
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     services = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Service.objects.all(), required=False, write_only=True
     )
@@ -17,6 +20,13 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         exclude = ('groups', 'user_permissions', 'is_active', 'is_staff', 'is_superuser', 'last_login')
+        expandable_fields = {
+            'services': {
+                'prefetch': [Prefetch('services', queryset=Service.objects.with_relations())],
+                'collapsed': ['services'],
+            },
+            'schedule': {'prefetch': ['schedule']},
+        }
 
     def to_internal_value(self, data):
         if isinstance(data, QueryDict):
@@ -55,9 +65,13 @@ class UserSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         from leads.serializers import ServiceSerializer
         representation = super().to_representation(instance)
-        representation["services"] = ServiceSerializer(instance.services, many=True).data
-        if instance.schedule.exists():
-            representation['schedule'] = EmployeeScheduleSerializer(instance.schedule, many=True).data
+        if self.is_expanded('services'):
+            representation["services"] = ServiceSerializer(instance.services.all(), many=True).data
+        elif self.wants('services'):
+            representation["services"] = [service.pk for service in instance.services.all()]
+        schedule = instance.schedule.all() if self.is_expanded('schedule') else None
+        if schedule:
+            representation['schedule'] = EmployeeScheduleSerializer(schedule, many=True).data
         return representation
 
     def update(self, instance, validated_data):
@@ -69,6 +83,31 @@ class UserSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+USER_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def user_cache_key(user_pk):
+    return f'users:representation:{user_pk}'
+
+
+def invalidate_user_cache(*user_pks):
+    cache.delete_many([user_cache_key(pk) for pk in user_pks])
+
+
+def cached_user_data(user):
+    """
+    UserSerializer(user).data из кеша. Сбрасывается сигналами (users/signals.py)
+    при изменении пользователя, его услуг и расписания.
+    """
+    key = user_cache_key(user.pk)
+    data = cache.get(key)
+    if data is None:
+        prefetch_related_objects([user], *profile_prefetches())
+        data = dict(UserSerializer(user).data)
+        cache.set(key, data, USER_CACHE_TIMEOUT)
+    return data
+
+
 class UserGet(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -94,7 +133,7 @@ class UserRegistration(serializers.Serializer):
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         data = super().validate(attrs)
-        data['user'] = UserSerializer(self.user).data
+        data['user'] = cached_user_data(self.user)
         return data
     
 
@@ -174,9 +213,12 @@ class ScheduleListSerializer(serializers.Serializer):
         for schedule in schedules_data:
             schedule['employee'] = user
 
-        return EmployeeSchedule.objects.bulk_create([
+        schedules = EmployeeSchedule.objects.bulk_create([
             EmployeeSchedule(**data) for data in schedules_data
         ])
+        # bulk_create не отправляет post_save
+        invalidate_user_cache(user.pk)
+        return schedules
 
 class EmployeeScheduleUpdateSerializer(serializers.ModelSerializer):
     schedules = serializers.ListField(child=serializers.DictField(), write_only=True, required=False)
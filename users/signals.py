@@ -0,0 +1,49 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from leads.models import Service
+from .models import EmployeeSchedule, User
+from .serializers import invalidate_user_cache
+
+
+def invalidate_service_masters(service_ids):
+    masters = User.services.through.objects.filter(service_id__in=service_ids).values_list('user_id', flat=True)
+    invalidate_user_cache(*set(masters))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user_cache(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=EmployeeSchedule)
+def schedule_changed(sender, instance, **kwargs):
+    invalidate_user_cache(instance.employee_id)
+
+
+@receiver(m2m_changed, sender=User.services.through)
+def user_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_user_cache(instance.pk)
+    elif action == 'pre_clear':
+        # после clear() со стороны услуги pk_set пуст, поэтому мастеров берем до очистки
+        invalidate_service_masters([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_cache(*pk_set)
+
+
+@receiver(post_save, sender=Service)
+@receiver(pre_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    # дополнительная услуга выводится и внутри своих основных услуг — сбрасываем и их мастеров
+    invalidate_service_masters([instance.pk, *instance.parent_services.values_list('pk', flat=True)])
+
+
+@receiver(m2m_changed, sender=Service.parent_services.through)
+def service_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        related = instance.additional_services if reverse else instance.parent_services
+        invalidate_service_masters([instance.pk, *related.values_list('pk', flat=True)])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_service_masters([instance.pk, *pk_set])
@@ -0,0 +1,52 @@
+import logging
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from celery import shared_task
+from celery.signals import worker_process_shutdown
+from django.db import transaction
+
+from .utils import close_sender, send_order_message
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_RETRIES = 5
+TELEGRAM_RETRY_DELAY = 10
+# Временные сбои: сеть, 5xx, 429 после исчерпания повторов внутри отправителя и таймаут всей отправки.
+# Остальные ошибки (бот заблокирован, чат не найден, неверный запрос) повтором не исправить.
+TELEGRAM_RETRY_ERRORS = (TelegramNetworkError, TelegramServerError, TelegramRetryAfter, TimeoutError)
+
+
+class TelegramSendError(Exception):
+    pass
+
+
+@shared_task(bind=True, max_retries=TELEGRAM_MAX_RETRIES)
+def send_telegram_message(self, message, chat_ids=None):
+    """
+    Task: отправляет сообщение в Telegram (по умолчанию операторам).
+    При временной ошибке повторяет отправку только тем, кому не дошло, с нарастающей задержкой;
+    чаты с постоянной ошибкой пропускаются с записью в лог.
+    """
+    countdown = TELEGRAM_RETRY_DELAY * 2 ** self.request.retries
+    try:
+        failed = send_order_message(message, chat_ids)
+    except TELEGRAM_RETRY_ERRORS as e:
+        raise self.retry(exc=e, countdown=countdown)
+
+    retry = {chat_id: e for chat_id, e in failed.items() if isinstance(e, TELEGRAM_RETRY_ERRORS)}
+    for chat_id, e in failed.items():
+        if chat_id not in retry:
+            logger.warning("Сообщение в Telegram-чат %s не отправлено: %r", chat_id, e)
+    if retry:
+        error = TelegramSendError(f"Не удалось отправить в чаты {list(retry)}: {list(retry.values())}")
+        raise self.retry(args=[message, list(retry)], exc=error, countdown=countdown)
+
+
+def queue_telegram_message(message, chat_ids=None):
+    """Ставит отправку в очередь после коммита транзакции, запрос не ждет Telegram."""
+    transaction.on_commit(lambda: send_telegram_message.delay(message, chat_ids), robust=True)
+
+
+@worker_process_shutdown.connect
+def close_telegram_sender(**kwargs):
+    close_sender()
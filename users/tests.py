@@ -1,3 +1,213 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramServerError
+from aiogram.methods import SendMessage
+from aiohttp import web
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from leads.models import Service
+from .models import User
+from .serializers import user_cache_key
+from .tasks import send_telegram_message
+from . import utils
+from .utils import TelegramSender
+
+
+class FakeBotAPI:
+    """
+    Заглушка Bot API: принимает sendMessage, первому запросу в чат из flood_chats отвечает 429.
+    sent — (chat_id, начало, конец) успешных запросов, flooded_at — время ответа 429.
+    """
+
+    def __init__(self, flood_chats=(), retry_after=1, delay=0):
+        self.flood_chats = set(flood_chats)
+        self.retry_after = retry_after
+        self.delay = delay
+        self.sent = []
+        self.flooded_at = None
+
+    async def handle(self, request):
+        started = time.monotonic()
+        data = await request.post()
+        chat_id = data['chat_id']
+        if chat_id in self.flood_chats:
+            self.flood_chats.discard(chat_id)
+            self.flooded_at = time.monotonic()
+            return web.json_response({
+                'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                'parameters': {'retry_after': self.retry_after},
+            })
+        if chat_id == 'blocked':
+            return web.json_response({'ok': False, 'error_code': 403, 'description': 'Forbidden: bot was blocked'})
+        await asyncio.sleep(self.delay)
+        self.sent.append((chat_id, started, time.monotonic()))
+        return web.json_response({'ok': True, 'result': {
+            'message_id': len(self.sent), 'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'}, 'text': data['text'],
+        }})
+
+    async def run(self, send, **sender_kwargs):
+        app = web.Application()
+        app.router.add_post('/bot{token}/sendMessage', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        host, port = runner.addresses[0][:2]
+        sender = TelegramSender('123:abc', api_url=f'http://{host}:{port}', **sender_kwargs)
+        try:
+            return await send(sender)
+        finally:
+            await sender.close()
+            await runner.cleanup()
+
+    def send_many(self, chat_ids, **sender_kwargs):
+        return asyncio.run(self.run(lambda sender: sender.send_many('Новая запись', chat_ids), **sender_kwargs))
+
+
+class TelegramSenderTest(SimpleTestCase):
+    # запас на неточность таймеров
+    TOLERANCE = 0.05
+
+    def test_sends_to_all_and_reports_failures(self):
+        api = FakeBotAPI()
+        failed = api.send_many(['1', '2', 'blocked', '3'])
+        self.assertEqual(sorted(chat_id for chat_id, _, _ in api.sent), ['1', '2', '3'])
+        self.assertEqual(list(failed), ['blocked'])
+
+    def test_retry_after_pauses_all_chats_then_keeps_global_rate(self):
+        api = FakeBotAPI(flood_chats={'1'}, retry_after=1)
+        failed = api.send_many([str(chat_id) for chat_id in range(1, 7)], global_rate=2)
+        self.assertEqual(failed, {})
+        self.assertEqual(sorted(chat_id for chat_id, _, _ in api.sent), [str(chat_id) for chat_id in range(1, 7)])
+
+        # 429 останавливает отправку всем чатам на retry_after (кроме запроса, уже ушедшего вместе с первым)
+        resumed = api.flooded_at + api.retry_after - self.TOLERANCE
+        after_pause = sorted(started for _, started, _ in api.sent if started > api.flooded_at + self.TOLERANCE)
+        self.assertTrue(after_pause)
+        self.assertGreaterEqual(after_pause[0], resumed)
+        # дальше — не больше global_rate отправок в любую секунду
+        for first, third in zip(after_pause, after_pause[2:]):
+            self.assertGreaterEqual(third - first, 1 - self.TOLERANCE)
+
+    def test_one_message_per_second_to_the_same_chat(self):
+        api = FakeBotAPI()
+
+        async def send_three(sender):
+            await asyncio.gather(*(sender.send('7', f'Сообщение {i}') for i in range(3)))
+
+        asyncio.run(api.run(send_three, global_rate=30))
+        starts = sorted(started for _, started, _ in api.sent)
+        self.assertEqual(len(starts), 3)
+        for previous, current in zip(starts, starts[1:]):
+            self.assertGreaterEqual(current - previous, 1 - self.TOLERANCE)
+
+    def test_different_chats_are_sent_concurrently(self):
+        api = FakeBotAPI(delay=0.3)
+        failed = api.send_many([str(chat_id) for chat_id in range(1, 6)], global_rate=30)
+        self.assertEqual(failed, {})
+        # все запросы были в обработке одновременно: последний начался раньше, чем закончился первый
+        self.assertLess(max(started for _, started, _ in api.sent), min(finished for _, _, finished in api.sent))
+
+    def test_idle_chat_limits_are_pruned(self):
+        async def fill(sender):
+            for chat_id in range(5):
+                await sender.chat_limit(chat_id).acquire()
+            busy = sender.chat_limit(4)
+            # ведра с только что взятым токеном еще не полные и должны сохраниться
+            for bucket in sender.chat_limits.values():
+                bucket.updated -= 2
+            busy.tokens, busy.updated = 0, time.monotonic()
+            sender.chat_limit('new')
+            return sender.chat_limits
+
+        with mock.patch('users.utils.TELEGRAM_CHAT_LIMITS_MAX', 5):
+            limits = asyncio.run(FakeBotAPI().run(fill))
+        self.assertEqual(set(limits), {4, 'new'})
+
+    def test_send_message_gives_up_after_timeout(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        sender = mock.Mock()
+
+        async def hang(message, chat_ids):
+            await asyncio.sleep(10)
+
+        sender.send_many = hang
+        try:
+            with mock.patch('users.utils.get_sender', return_value=(sender, loop)), \
+                    mock.patch('users.utils.TELEGRAM_SEND_TIMEOUT', 0.1), \
+                    self.assertLogs('users.utils', 'WARNING'), self.assertRaises(TimeoutError):
+                utils.send_message('Новая запись', ['1'])
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=1)
+
+
+class UserCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.master = User.objects.create_user(email='master@example.com')
+        self.base = Service.objects.create(name='Маникюр')
+        self.extra = Service.objects.create(name='Дизайн', is_additional=True)
+        self.extra.parent_services.add(self.base)
+        self.master.services.add(self.base)
+        self.client = APIClient()
+        self.client.force_authenticate(self.master)
+
+    def cache_me(self):
+        response = self.client.get('/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(cache.get(user_cache_key(self.master.pk)))
+
+    def test_me_cache_reset_on_profile_and_service_change(self):
+        self.cache_me()
+        self.master.first_name = 'Айгуль'
+        self.master.save()
+        self.assertIsNone(cache.get(user_cache_key(self.master.pk)))
+
+        self.cache_me()
+        self.base.name = 'Маникюр классический'
+        self.base.save()
+        self.assertIsNone(cache.get(user_cache_key(self.master.pk)))
+
+    def test_me_cache_reset_on_additional_service_change(self):
+        self.cache_me()
+        self.extra.name = 'Дизайн ногтей'
+        self.extra.save()
+        self.assertIsNone(cache.get(user_cache_key(self.master.pk)))
+
+        self.cache_me()
+        self.extra.delete()
+        self.assertIsNone(cache.get(user_cache_key(self.master.pk)))
+
+
+class SendTelegramTaskTest(SimpleTestCase):
+    def error(self, error_class, chat_id):
+        return error_class(method=SendMessage(chat_id=chat_id, text='Новая запись'), message='Ошибка')
+
+    @mock.patch('users.tasks.send_order_message')
+    def test_retries_only_temporary_failures(self, send_order_message):
+        send_order_message.return_value = {
+            '1': self.error(TelegramForbiddenError, 1),
+            '2': self.error(TelegramServerError, 2),
+            '3': self.error(TelegramBadRequest, 3),
+        }
+        with mock.patch.object(send_telegram_message, 'retry', return_value=RuntimeError('retry')) as retry, \
+                self.assertLogs('users.tasks', 'WARNING') as logs:
+            with self.assertRaises(RuntimeError):
+                send_telegram_message('Новая запись', ['1', '2', '3'])
+        self.assertEqual(retry.call_args.kwargs['args'], ['Новая запись', ['2']])
+        self.assertEqual(len(logs.records), 2)
+
+    @mock.patch('users.tasks.send_order_message')
+    def test_permanent_failures_are_dropped(self, send_order_message):
+        send_order_message.return_value = {'1': self.error(TelegramForbiddenError, 1)}
+        with mock.patch.object(send_telegram_message, 'retry') as retry, self.assertLogs('users.tasks', 'WARNING'):
+            send_telegram_message('Новая запись', ['1'])
+        retry.assert_not_called()
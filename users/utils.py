@@ -1,15 +1,148 @@
 import asyncio
+import logging
+import threading
+import time
 from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
 from decouple import config
 
+logger = logging.getLogger(__name__)
+
 TELEGRAM_TOKEN = config('TELEGRAM_BOT')
 OPERATORS = config('OPERATORS_CHAT_IDS').split(',')
+# Для проверки на локальном сервере Bot API (telegram-bot-api или заглушка), например http://localhost:8081
+TELEGRAM_API_URL = config('TELEGRAM_API_URL', default='https://api.telegram.org')
+
+# Лимиты Bot API: около 30 сообщений в секунду на бота, 1 в секунду в один чат, 20 в минуту в группу.
+# Лимит на бота считается в процессе: при нескольких процессах воркера задайте TELEGRAM_GLOBAL_RATE меньше.
+TELEGRAM_GLOBAL_RATE = config('TELEGRAM_GLOBAL_RATE', default=30, cast=float)
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_GROUP_RATE = 20 / 60
+TELEGRAM_RETRY_AFTER_ATTEMPTS = 3
+# Сколько воркер ждет отправку одного сообщения всем получателям
+TELEGRAM_SEND_TIMEOUT = config('TELEGRAM_SEND_TIMEOUT', default=120, cast=float)
+# Сверх этого числа лимитов по чатам неактивные удаляются
+TELEGRAM_CHAT_LIMITS_MAX = 1000
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now > self.updated:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(self.blocked_until - now, (1 - self.tokens) / self.rate))
+
+    def idle(self):
+        """Ведро полное и никто его не ждет — его можно удалить, новое будет таким же."""
+        now = time.monotonic()
+        refilled = self.tokens + max(now - self.updated, 0) * self.rate
+        return not self._lock.locked() and now >= self.blocked_until and refilled >= self.capacity
+
+    def pause(self, seconds):
+        # токены начинают копиться только после паузы: иначе сразу после нее ушла бы пачка до capacity
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+        self.updated = self.blocked_until
+
+
+class TelegramSender:
+    """
+    Долгоживущий отправитель: один Bot и одна HTTP-сессия на процесс,
+    параллельная отправка всем получателям с ограничением частоты и учетом 429 (retry_after).
+    """
+
+    def __init__(self, token=TELEGRAM_TOKEN, api_url=TELEGRAM_API_URL, global_rate=TELEGRAM_GLOBAL_RATE):
+        self.bot = Bot(token, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+        self.global_limit = TokenBucket(global_rate, capacity=max(int(global_rate), 1))
+        self.chat_limits = {}
+
+    def chat_limit(self, chat_id):
+        if chat_id not in self.chat_limits:
+            if len(self.chat_limits) >= TELEGRAM_CHAT_LIMITS_MAX:
+                self.chat_limits = {key: bucket for key, bucket in self.chat_limits.items() if not bucket.idle()}
+            is_group = str(chat_id).startswith('-')
+            self.chat_limits[chat_id] = TokenBucket(TELEGRAM_GROUP_RATE if is_group else TELEGRAM_CHAT_RATE)
+        return self.chat_limits[chat_id]
+
+    async def send(self, chat_id, message):
+        for attempt in range(TELEGRAM_RETRY_AFTER_ATTEMPTS + 1):
+            await self.chat_limit(chat_id).acquire()
+            await self.global_limit.acquire()
+            try:
+                return await self.bot.send_message(chat_id, message)
+            except TelegramRetryAfter as e:
+                if attempt == TELEGRAM_RETRY_AFTER_ATTEMPTS:
+                    raise
+                # flood control Telegram распространяется на весь бот, а не только на этот чат
+                self.global_limit.pause(e.retry_after)
+
+    async def send_many(self, message, chat_ids):
+        """Отправляет всем сразу; возвращает {chat_id: ошибка} для тех, кому отправить не удалось."""
+        results = await asyncio.gather(*(self.send(chat_id, message) for chat_id in chat_ids), return_exceptions=True)
+        return {chat_id: result for chat_id, result in zip(chat_ids, results) if isinstance(result, Exception)}
+
+    async def close(self):
+        await self.bot.session.close()
+
+
+_sender = None
+_sender_loop = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """
+    Отправитель процесса и его event loop в фоновом потоке: сессия и лимиты
+    переживают отдельные задачи Celery (asyncio.run на каждую задачу закрывал бы сессию).
+    """
+    global _sender, _sender_loop
+    with _sender_lock:
+        if _sender is None:
+            _sender_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sender_loop.run_forever, name='telegram-sender', daemon=True).start()
+            _sender = TelegramSender()
+    return _sender, _sender_loop
+
+
+def close_sender():
+    global _sender, _sender_loop
+    with _sender_lock:
+        if _sender is None:
+            return
+        asyncio.run_coroutine_threadsafe(_sender.close(), _sender_loop).result(timeout=5)
+        _sender_loop.call_soon_threadsafe(_sender_loop.stop)
+        _sender = _sender_loop = None
+
 
-async def send_message(message, chat_ids):
-    bot = Bot(TELEGRAM_TOKEN)
-    for chat_id in chat_ids:
-        await bot.send_message(chat_id, message)
+def send_message(message, chat_ids):
+    sender, loop = get_sender()
+    future = asyncio.run_coroutine_threadsafe(sender.send_many(message, list(chat_ids)), loop)
+    try:
+        return future.result(timeout=TELEGRAM_SEND_TIMEOUT)
+    except TimeoutError:
+        # зависший запрос не должен держать воркер Celery; задача повторит отправку
+        future.cancel()
+        logger.warning("Отправка в Telegram не завершилась за %s с, чаты: %s", TELEGRAM_SEND_TIMEOUT, list(chat_ids))
+        raise
 
-async def send_order_message(message, chat_ids=None):
+def send_order_message(message, chat_ids=None):
     recipients = chat_ids or OPERATORS
-    await send_message(message, recipients)
+    return send_message(message, recipients)
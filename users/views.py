@@ -16,9 +16,11 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
+from core.routers import ReplicaReadMixin
+from core.serializers import DynamicFieldsViewMixin
 from leads.models import Lead, Service
 from .models import User, EmployeeSchedule
-from .serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, UserChangePassword, UserRegistration, UserSerializer, FireUser, EmployeeScheduleSerializer, ScheduleListSerializer, EmployeeScheduleUpdateSerializer
+from .serializers import cached_user_data, CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, UserChangePassword, UserRegistration, UserSerializer, FireUser, EmployeeScheduleSerializer, ScheduleListSerializer, EmployeeScheduleUpdateSerializer
 
 
 class EmployeeListView(ListAPIView):
@@ -34,7 +36,7 @@ class EmployeeListView(ListAPIView):
             return User.objects.none()
 
         service_ids = [int(s) for s in service_ids_param.split(',') if s]
-        queryset = User.objects.filter(is_active=True, is_employee=True)
+        queryset = User.objects.with_profile().filter(is_active=True, is_employee=True)
         for sid in service_ids:
             queryset = queryset.filter(services__id=sid)
             
@@ -128,8 +130,8 @@ class EmployeeListView(ListAPIView):
         return super().list(request, *args, **kwargs)
 
 
-class UserViewSet(ModelViewSet):
-    queryset = User.objects.all()
+class UserViewSet(DynamicFieldsViewMixin, ModelViewSet):
+    queryset = User.objects.with_profile()
     serializer_class = UserSerializer
 
     def get_permissions(self):
@@ -228,8 +230,7 @@ class MeView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        return Response(cached_user_data(request.user))
 
 
 
@@ -266,7 +267,7 @@ class EmployeeScheduleViewSet(ModelViewSet):
     queryset = EmployeeSchedule.objects.all()
     serializer_class = EmployeeScheduleSerializer
 
-class MasterSummaryView(APIView):
+class MasterSummaryView(ReplicaReadMixin, APIView):
 
     def get(self, request, *args, **kwargs):
         masters = User.objects.filter(is_employee=True)